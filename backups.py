@@ -0,0 +1,94 @@
+"""Rotating gzipped snapshots of the database.
+
+Snapshots are named ``elo-YYYYmmdd-HHMMSS.db.gz`` after the UTC time they
+were taken, so sorting the names sorts them by age. Files are written
+under a temporary name and renamed when complete, so a snapshot that is
+listed is always whole.
+"""
+import asyncio
+import gzip
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import aiosqlite
+
+from database import Database, integrity_problems
+
+PREFIX = 'elo-'
+SUFFIX = '.db.gz'
+
+
+def _compress(source: Path, target: Path) -> None:
+    partial = target.with_name(target.name + '.part')
+    with open(source, 'rb') as raw, gzip.open(partial, 'wb') as packed:
+        shutil.copyfileobj(raw, packed)
+    os.replace(partial, target)
+
+
+def _decompress(source: Path, target: Path) -> None:
+    with gzip.open(source, 'rb') as packed, open(target, 'wb') as raw:
+        shutil.copyfileobj(packed, raw)
+
+
+class Snapshots:
+    """The snapshots in ``directory``, of which the newest ``keep`` are
+    kept."""
+
+    def __init__(self, db: Database, directory: str, keep: int = 14):
+        self.db = db
+        self.directory = Path(directory)
+        self.keep = keep
+
+    def paths(self) -> list[Path]:
+        """Every snapshot, newest first."""
+        return sorted(self.directory.glob(f'{PREFIX}*{SUFFIX}'),
+                      reverse=True)
+
+    def find(self, name: str) -> Optional[Path]:
+        """The snapshot called ``name``, with or without its suffix."""
+        if not name.endswith(SUFFIX):
+            name += SUFFIX
+        path = self.directory / name
+        return path if path in self.paths() else None
+
+    async def take(self, now: datetime, prune: bool = True) -> Path:
+        """Snapshot the database, then unless ``prune`` is false drop all
+        but the newest ``keep``."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f'{PREFIX}{now:%Y%m%d-%H%M%S}{SUFFIX}'
+        copy = self.directory / f'.{path.stem}'
+        try:
+            await self.db.backup(str(copy))
+            await asyncio.to_thread(_compress, copy, path)
+        finally:
+            copy.unlink(missing_ok=True)
+
+        if prune:
+            for old in self.paths()[self.keep:]:
+                old.unlink()
+        return path
+
+    async def restore(self, path: Path) -> list[str]:
+        """Replace the database with the snapshot at ``path``.
+
+        The snapshot is unpacked and checked first, and a damaged one
+        raises ValueError without touching the database. Returns the
+        problems an integrity check of the restored database finds, if any.
+        """
+        copy = self.directory / '.restore.db'
+        try:
+            await asyncio.to_thread(_decompress, path, copy)
+            async with aiosqlite.connect(f'file:{copy}?mode=ro',
+                                         uri=True) as db:
+                problems = await integrity_problems(db)
+            if problems:
+                raise ValueError(f"{path.name} is damaged: {problems[0]}")
+            await self.db.restore(str(copy))
+        except (OSError, aiosqlite.DatabaseError) as e:
+            raise ValueError(f"{path.name} could not be read: {e}") from None
+        finally:
+            copy.unlink(missing_ok=True)
+        return await self.db.integrity_check()
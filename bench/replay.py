@@ -0,0 +1,351 @@
+"""Offline event-replay benchmark for the scoring hot paths.
+
+Drives the ``on_message`` and ``on_voice_state_update`` listeners and the
+decay sweep of the scoring cog with lightweight fake Discord
+objects against a temporary SQLite file. Members are real
+``discord.Member`` objects, so role checks take the same path as live
+events. Nothing connects to the gateway.
+
+``chat`` draws authors at random and soon runs into the scoring gate's
+per-user burst, so it mostly measures throttling. ``steady`` cycles
+through the members and stops each one at the burst, so every message is
+admitted and the run measures the scoring writes.
+
+    python bench/replay.py chat --users 500 --events 20000 --rate 2000
+    python bench/replay.py steady --users 2000 --events 10000
+    python bench/replay.py voice --users 200 --events 5000
+    python bench/replay.py decay --users 50000
+    python bench/replay.py chat --compare bench/results/chat-<stamp>.json
+
+Each run writes a JSON result to bench/results/ (or --output). ``--compare``
+prints the change against an earlier result and exits non-zero when
+throughput or p99 latency regressed by more than ``--tolerance``.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import discord
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS = ROOT / 'bench' / 'results'
+
+
+class FakeRole:
+
+    def __init__(self, role_id, name, members=()):
+        self.id = role_id
+        self.name = name
+        self.members = list(members)
+
+
+class FakeGuild:
+
+    def __init__(self, guild_id):
+        self.id = guild_id
+        self.roles = []
+        self.voice_channels = []
+        self.stage_channels = []
+        self.text_channels = []
+
+    def get_role(self, role_id):
+        return next((role for role in self.roles if role.id == role_id), None)
+
+    def get_channel(self, channel_id):
+        return next((channel for channel in self.voice_channels +
+                     self.text_channels if channel.id == channel_id), None)
+
+    def get_member(self, member_id):
+        return None
+
+
+class FakeChannel:
+
+    def __init__(self, channel_id, name, guild):
+        self.id = channel_id
+        self.name = name
+        self.guild = guild
+        self.category_id = None
+        self.members = []
+
+
+def make_member(state, guild, member_id, role_ids=()):
+    """A ``discord.Member`` built from a gateway payload, as the listeners
+    would receive it."""
+    data = {
+        'user': {
+            'id': str(member_id),
+            'username': f"member{member_id}",
+            'discriminator': '0',
+            'global_name': None,
+            'avatar': None,
+        },
+        'roles': [str(role_id) for role_id in role_ids],
+        'joined_at': None,
+        'flags': 0,
+    }
+    return discord.Member(data=data, guild=guild, state=state)
+
+
+class FakeMessage:
+
+    def __init__(self, author, channel, content):
+        self.author = author
+        self.channel = channel
+        self.guild = author.guild
+        self.content = content
+
+
+class FakeVoiceState:
+
+    def __init__(self, channel=None):
+        self.channel = channel
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              cwd=ROOT,
+                              capture_output=True,
+                              text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Harness:
+
+    def __init__(self, bot, args):
+        self.bot = bot
+        self.scoring = None
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.guild = FakeGuild(1)
+        self.text = FakeChannel(10, "general", self.guild)
+        self.guild.text_channels.append(self.text)
+        self.guild.voice_channels = [
+            FakeChannel(20, "Operation Alpha", self.guild),
+            FakeChannel(21, "Roam 1", self.guild),
+            FakeChannel(22, "Lounge", self.guild),
+        ]
+        shaded = int(args.users * args.shaded)
+        self.members = [
+            make_member(bot._connection, self.guild, 100000 + i,
+                        (1, ) if i < shaded else ())
+            for i in range(args.users)
+        ]
+        self.guild.roles.append(FakeRole(1, "Shade", self.members[:shaded]))
+        self.latencies = []
+
+    async def timed(self, handler, *event):
+        started = time.perf_counter()
+        await handler(*event)
+        self.latencies.append(time.perf_counter() - started)
+
+    async def paced(self, events):
+        """Replay ``(handler, *event)`` tuples at ``--rate`` events/sec
+        (as fast as possible when the rate is 0)."""
+        interval = 1 / self.args.rate if self.args.rate else 0
+        started = time.perf_counter()
+        for index, (handler, *event) in enumerate(events):
+            if interval:
+                delay = started + index * interval - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await self.timed(handler, *event)
+
+    def chat_events(self):
+        for _ in range(self.args.events):
+            author = self.rng.choice(self.members)
+            yield (self.scoring.on_message,
+                   FakeMessage(author, self.text, "o7 reapers"))
+
+    def steady_events(self):
+        # Each member posts at most the gate's burst, so none is throttled;
+        # the run ends early when the members run out
+        burst = int(self.bot.scoring_gate.burst)
+        authors = itertools.chain.from_iterable(
+            itertools.repeat(self.members, burst))
+        for author in itertools.islice(authors, self.args.events):
+            yield (self.scoring.on_message,
+                   FakeMessage(author, self.text, "o7 reapers"))
+
+    def voice_events(self):
+        connected = {}
+        for _ in range(self.args.events):
+            member = self.rng.choice(self.members)
+            before = connected.get(member.id)
+            if before is None:
+                after = self.rng.choice(self.guild.voice_channels)
+            elif self.rng.random() < 0.3:
+                after = self.rng.choice(self.guild.voice_channels)
+            else:
+                after = None
+            if after is None:
+                connected.pop(member.id)
+            else:
+                connected[member.id] = after
+            yield (self.scoring.on_voice_state_update, member,
+                   FakeVoiceState(before), FakeVoiceState(after))
+
+    async def seed_decay(self):
+        now = datetime.utcnow()
+        activity_buffer = self.bot.activity_buffer
+        max_pending = activity_buffer.max_pending
+        activity_buffer.max_pending = len(self.members) + 1
+        for member in self.members:
+            idle = timedelta(days=self.rng.uniform(0, 10))
+            activity_buffer.record(self.guild.id, member.id, 1000, now - idle)
+        await activity_buffer.flush()
+        activity_buffer.max_pending = max_pending
+
+    async def run(self):
+        from cogs.scoring import Scoring
+
+        bot = self.bot
+        db = bot.db
+        await db.connect()
+        try:
+            bot.role_index.rebuild(self.guild)
+            await bot.leaderboard.rebuild()
+            # Used unregistered so its background tasks stay stopped; the
+            # buffer flushes on its size threshold and once at the end
+            self.scoring = Scoring(bot)
+            bot.voice_tracker.rate_for = self.scoring.rate_for
+            workload = self.args.workload
+            if workload == 'decay':
+                await self.seed_decay()
+                events = [(self.scoring.decay, [self.guild.id])]
+            elif workload == 'voice':
+                events = self.voice_events()
+            elif workload == 'steady':
+                events = self.steady_events()
+            else:
+                events = self.chat_events()
+
+            changes, commits = db.total_changes, db.commits
+            gate = bot.scoring_gate
+            accepted, throttled = gate.accepted, gate.throttled
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                await self.paced(events)
+                await bot.activity_buffer.flush()
+                if workload == 'voice':
+                    await bot.voice_tracker.accrue(datetime.utcnow())
+            elapsed = time.perf_counter() - started
+            changes = db.total_changes - changes
+            commits = db.commits - commits
+            accepted = gate.accepted - accepted
+            throttled = gate.throttled - throttled
+        finally:
+            await db.close()
+
+        count = len(self.latencies)
+        return {
+            'workload': self.args.workload,
+            'params': {
+                'users': self.args.users,
+                'events': count,
+                'rate': self.args.rate,
+                'shaded': self.args.shaded,
+                'seed': self.args.seed,
+            },
+            'revision': git_revision(),
+            'recorded_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'elapsed_s': round(elapsed, 4),
+            'events_per_s': round(count / elapsed, 1) if elapsed else None,
+            'p50_ms': round(percentile(self.latencies, 0.50) * 1000, 4),
+            'p99_ms': round(percentile(self.latencies, 0.99) * 1000, 4),
+            'max_ms': round(max(self.latencies, default=0) * 1000, 4),
+            'rows_written': changes,
+            'rows_per_event': round(changes / count, 4) if count else None,
+            'commits': commits,
+            'commits_per_event': round(commits / count, 4) if count else None,
+            'scoring_accepted': accepted,
+            'scoring_throttled': throttled,
+        }
+
+
+def compare(result, baseline, tolerance):
+    """Print the change against ``baseline``; return True on regression."""
+    regressed = False
+    for key, higher_is_better in (('events_per_s', True), ('p50_ms', False),
+                                  ('p99_ms', False), ('rows_per_event', False),
+                                  ('commits_per_event', False)):
+        old, new = baseline.get(key), result.get(key)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        flag = ''
+        if worse > tolerance and key in ('events_per_s', 'p99_ms'):
+            flag = '  <-- regression'
+            regressed = True
+        print(f"{key:>18}: {old:>12} -> {new:>12} ({change:+.1%}){flag}")
+    return regressed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('workload',
+                        choices=('chat', 'steady', 'voice', 'decay'))
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--rate',
+                        type=float,
+                        default=0,
+                        help="target events/sec, 0 for unthrottled")
+    parser.add_argument('--shaded',
+                        type=float,
+                        default=0.05,
+                        help="share of members holding the Shade role")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', type=Path)
+    parser.add_argument('--compare', type=Path)
+    parser.add_argument('--tolerance', type=float, default=0.10)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory() as tmp:
+        # main.py reads the database path when it is imported
+        os.environ['ELO_DATABASE'] = os.path.join(tmp, 'bench.db')
+        sys.path.insert(0, str(ROOT))
+        from main import bot
+
+        result = asyncio.run(Harness(bot, args).run())
+
+    print(json.dumps(result, indent=2))
+    output = args.output or RESULTS / (
+        f"{args.workload}-{datetime.utcnow():%Y%m%dT%H%M%S}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2) + '\n')
+    print(f"Saved to {output}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        if compare(result, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
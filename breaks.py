@@ -0,0 +1,101 @@
+import asyncio
+import heapq
+from datetime import datetime
+from typing import Awaitable, Callable, Optional
+
+from database import Database
+
+# Longest single sleep, so a wall clock adjustment is noticed within it
+MAX_SLEEP = 3600
+# Wait before retrying expiries whose database write failed
+RETRY_DELAY = 60
+
+
+class BreakScheduler:
+    """Ends breaks when their ``break_end`` passes.
+
+    Pending ends are kept in a min-heap rebuilt from the ``users`` table by
+    :meth:`load`. :meth:`run` sleeps until the earliest one and is only
+    woken early when a sooner break is scheduled, so the table is never
+    polled. Rescheduled and cancelled breaks leave stale heap entries that
+    are dropped when they reach the top. Breaks are keyed by ``(guild_id,
+    user_id)`` and only the guilds passed to :meth:`load` are tracked.
+    ``on_expire`` receives the keys whose break just ended.
+    """
+
+    def __init__(self, db: Database,
+                 on_expire: Callable[[list[tuple[int, str]]],
+                                     Awaitable[None]]):
+        self.db = db
+        self.on_expire = on_expire
+        self._heap: list[tuple[datetime, int, str]] = []
+        self._ends: dict[tuple[int, str], datetime] = {}
+        self._changed = asyncio.Event()
+
+    def __contains__(self, key: tuple[int, int]) -> bool:
+        guild_id, user_id = key
+        return (guild_id, str(user_id)) in self._ends
+
+    async def load(self, guild_ids: list[int]) -> None:
+        for guild_id, user_id, _, end in await self.db.users_on_break(
+                guild_ids):
+            if end is not None:
+                self.schedule(guild_id, user_id, end)
+
+    def schedule(self, guild_id: int, user_id: int, end: datetime) -> None:
+        user_id = str(user_id)
+        self._ends[(guild_id, user_id)] = end
+        heapq.heappush(self._heap, (end, guild_id, user_id))
+        if self._heap[0] == (end, guild_id, user_id):
+            self._changed.set()
+
+    def cancel(self, guild_id: int, user_id: int) -> None:
+        self._ends.pop((guild_id, str(user_id)), None)
+
+    def next_end(self) -> Optional[datetime]:
+        while self._heap:
+            end, guild_id, user_id = self._heap[0]
+            if self._ends.get((guild_id, user_id)) == end:
+                return end
+            heapq.heappop(self._heap)
+        return None
+
+    def _pop_due(self, now: datetime) -> list[tuple[int, str, datetime]]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            end, guild_id, user_id = heapq.heappop(self._heap)
+            if self._ends.get((guild_id, user_id)) == end:
+                del self._ends[(guild_id, user_id)]
+                due.append((guild_id, user_id, end))
+        return due
+
+    async def run(self) -> None:
+        while True:
+            self._changed.clear()
+            now = datetime.utcnow()
+            due = self._pop_due(now)
+            if due:
+                try:
+                    expired = await self.db.expire_breaks(due)
+                except Exception as e:
+                    print(f"Break expiry failed: {e}")
+                    await asyncio.sleep(RETRY_DELAY)
+                    for guild_id, user_id, end in due:
+                        if (guild_id, user_id) not in self._ends:
+                            self.schedule(guild_id, user_id, end)
+                    continue
+                if expired:
+                    print(f"[BREAK] {len(expired)} breaks ended")
+                    try:
+                        await self.on_expire(expired)
+                    except Exception as e:
+                        print(f"Break expiry follow-up failed: {e}")
+                continue
+
+            end = self.next_end()
+            timeout = MAX_SLEEP if end is None else min(
+                MAX_SLEEP, (end - now).total_seconds())
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
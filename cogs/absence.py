@@ -0,0 +1,210 @@
+import asyncio
+from datetime import datetime
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from breaks import BreakScheduler
+from members import ensure_members
+from metrics import TimedModal, timed
+
+# Members listed per !onbreak embed
+ON_BREAK_PAGE = 25
+
+
+class AbsenceModal(TimedModal, title="Absence Request"):
+    start_date = discord.ui.TextInput(label="Start Date (DD-MM-YYYY)",
+                                      placeholder="09-04-2025")
+    end_date = discord.ui.TextInput(label="End Date (DD-MM-YYYY)",
+                                    placeholder="16-04-2025")
+    reason = discord.ui.TextInput(label="Reason",
+                                  placeholder="Note or justification...",
+                                  style=discord.TextStyle.paragraph)
+
+    async def on_submit(self, interaction: discord.Interaction):
+        try:
+            break_start = datetime.strptime(self.start_date.value, '%d-%m-%Y')
+            break_end = datetime.strptime(self.end_date.value, '%d-%m-%Y')
+        except ValueError:
+            await interaction.response.send_message(
+                "Invalid format. Use DD-MM-YYYY.", ephemeral=True)
+            return
+
+        if break_start >= break_end:
+            await interaction.response.send_message(
+                "Start date must be before end date.", ephemeral=True)
+            return
+
+        await interaction.client.get_cog("Absence").record_break(
+            interaction.guild.id, interaction.user.id, break_start, break_end)
+
+        await interaction.response.send_message(
+            "Your absence request has been submitted. An admin will assign the `Shade` role.",
+            ephemeral=True)
+
+        channel = interaction.client.guild_settings.channel(
+            interaction.guild, 'absence_channel_id')
+        if channel:
+            embed = discord.Embed(
+                title="👻 New Absence Request",
+                description=f"**From:** {interaction.user.mention}",
+                color=discord.Color.dark_purple())
+            embed.add_field(name="Reason",
+                            value=self.reason.value,
+                            inline=False)
+            embed.add_field(
+                name="Period",
+                value=
+                f"From **{self.start_date.value}** to **{self.end_date.value}**",
+                inline=False)
+            view = discord.ui.View(timeout=None)
+            view.add_item(ApproveBreakButton(interaction.user.id))
+            await channel.send(embed=embed, view=view)
+
+
+class ApproveBreakButton(discord.ui.DynamicItem[discord.ui.Button],
+                         template=r'absence:approve:(?P<user_id>[0-9]+)'):
+    """Approve button on an absence request; gives the member the Shade
+    role. The member ID lives in the custom_id, so buttons on old requests
+    keep working across restarts."""
+
+    def __init__(self, user_id: int):
+        super().__init__(
+            discord.ui.Button(label="Approve",
+                              style=discord.ButtonStyle.success,
+                              custom_id=f"absence:approve:{user_id}"))
+        self.user_id = user_id
+        self.callback = timed('ui', "ApproveBreakButton.approve",
+                              self.approve)
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(int(match['user_id']))
+
+    async def interaction_check(self,
+                                interaction: discord.Interaction) -> bool:
+        if interaction.permissions.administrator:
+            return True
+        await interaction.response.send_message(
+            "❌ Only admins can approve breaks.", ephemeral=True)
+        return False
+
+    async def approve(self, interaction: discord.Interaction):
+        absence = interaction.client.get_cog("Absence")
+        if absence is None or (interaction.guild.id,
+                               self.user_id) not in absence.breaks:
+            await interaction.response.send_message(
+                "This break has already ended.", ephemeral=True)
+            return
+        await absence.set_shaded(interaction.guild, [self.user_id], True)
+        self.item.disabled = True
+        self.item.label = f"Approved by {interaction.user.name}"
+        await interaction.response.edit_message(view=self.view)
+
+
+def format_day(moment):
+    return f"{moment:%d-%m-%Y}" if moment else "?"
+
+
+class Absence(commands.Cog):
+    """Absence requests and the members currently on break.
+
+    Approving a request gives the member the Shade role; when the break
+    ends, or the member says ``!back``, the role is taken away again.
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.breaks = BreakScheduler(bot.db, self.end_breaks)
+        self.breaks_task = None
+
+    async def cog_load(self):
+        self.bot.add_dynamic_items(ApproveBreakButton)
+        self.breaks_task = asyncio.create_task(self.run_breaks())
+
+    async def cog_unload(self):
+        self.bot.remove_dynamic_items(ApproveBreakButton)
+        self.breaks_task.cancel()
+
+    async def run_breaks(self):
+        # Roles can only be changed once the guilds are cached, and only
+        # then are this process's guilds known
+        await self.bot.wait_until_ready()
+        await self.breaks.load([guild.id for guild in self.bot.guilds])
+        await self.breaks.run()
+
+    async def record_break(self, guild_id: int, user_id: int,
+                           start: datetime, end: datetime) -> None:
+        await self.bot.db.set_break(guild_id, user_id, start, end)
+        self.breaks.schedule(guild_id, user_id, end)
+
+    async def set_shaded(self, guild: discord.Guild, user_ids: list[int],
+                         shaded: bool) -> None:
+        role = self.bot.role_index.role(guild, "Shade")
+        if role is None:
+            return
+        members = await ensure_members(guild, user_ids)
+        for member in members.values():
+            if (member.get_role(role.id) is not None) == shaded:
+                continue
+            if shaded:
+                await member.add_roles(role, reason="Break approved")
+            else:
+                await member.remove_roles(role, reason="Break ended")
+
+    async def end_breaks(self, ended: list[tuple[int, str]]) -> None:
+        for guild_id, user_id in ended:
+            guild = self.bot.get_guild(guild_id)
+            if guild is not None:
+                await self.set_shaded(guild, [int(user_id)], False)
+
+    async def request(self, interaction: discord.Interaction):
+        await interaction.response.send_modal(AbsenceModal())
+
+    @app_commands.command(name="away", description="Request an absence period")
+    @app_commands.guild_only()
+    async def away_slash_command(self, interaction: discord.Interaction):
+        await self.request(interaction)
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild):
+        await self.breaks.load([guild.id])
+
+    @commands.command(name='back')
+    @commands.guild_only()
+    async def end_absence(self, ctx):
+        await self.bot.db.end_break(ctx.guild.id, ctx.author.id)
+        self.breaks.cancel(ctx.guild.id, ctx.author.id)
+        await self.set_shaded(ctx.guild, [ctx.author.id], False)
+        await ctx.send('Welcome back among us Reaper!.')
+
+    @commands.command(name="onbreak")
+    @commands.has_permissions(administrator=True)
+    async def show_on_break(self, ctx):
+        rows = await self.bot.db.users_on_break([ctx.guild.id])
+        if not rows:
+            await ctx.send("No members are currently on break.")
+            return
+
+        # One embed per page, sent as soon as its names are resolved
+        pages = [
+            rows[i:i + ON_BREAK_PAGE]
+            for i in range(0, len(rows), ON_BREAK_PAGE)
+        ]
+        for number, page in enumerate(pages, start=1):
+            names = await self.bot.user_resolver.names(
+                ctx.guild, [int(user_id) for _, user_id, _, _ in page])
+            embed = discord.Embed(
+                title="Members that are currently on break",
+                description="\n".join(
+                    f"• {names[int(user_id)]} – from {format_day(start)} to {format_day(end)}"
+                    for _, user_id, start, end in page),
+                color=discord.Color.dark_purple())
+            embed.set_footer(
+                text=f"Page {number}/{len(pages)} · {len(rows)} members")
+            await ctx.send(embed=embed)
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(Absence(bot))
@@ -0,0 +1,137 @@
+import re
+
+import discord
+from discord.ext import commands
+
+from guilds import SETTINGS
+from metrics import REGISTRY, rss_bytes
+
+
+class Admin(commands.Cog):
+    """Runtime stats, per-guild settings and extension hot reload."""
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    @commands.command(name='stats')
+    @commands.has_permissions(administrator=True)
+    async def show_stats(self, ctx):
+
+        def timing(histogram):
+            return (f"p50 {histogram.quantile(0.5) * 1000:g} ms · "
+                    f"p99 {histogram.quantile(0.99) * 1000:g} ms · "
+                    f"n={histogram.count}")
+
+        activity_buffer = self.bot.activity_buffer
+        gate = self.bot.scoring_gate
+        embed = discord.Embed(title="📈 Bot Stats", color=0x393A41)
+        embed.add_field(
+            name="Runtime",
+            value=(
+                f"Gateway latency: {self.bot.gateway_latency() * 1000:.0f} ms\n"
+                f"Event loop lag: {timing(REGISTRY.loop_lag)}\n"
+                f"Activity buffer: {activity_buffer.pending_rows} pending · "
+                f"{activity_buffer.flushed_rows} flushed\n"
+                f"Voice sessions: {len(self.bot.voice_tracker.sessions)} open\n"
+                f"Scoring: {gate.accepted} accepted · {gate.throttled} "
+                f"throttled · {gate.denied} denied\n"
+                f"Memory: {rss_bytes() / 2**20:.1f} MiB RSS · "
+                f"{self.bot.cached_members()} members cached"),
+            inline=False)
+
+        slowest = sorted(REGISTRY.handlers.items(),
+                         key=lambda item: item[1].quantile(0.99),
+                         reverse=True)[:10]
+        embed.add_field(name="Slowest handlers (p99)",
+                        value="\n".join(
+                            f"`{kind}:{name}` {timing(histogram)}"
+                            for (kind, name), histogram in slowest)
+                        or "No data yet.",
+                        inline=False)
+
+        busiest = sorted(REGISTRY.sql.items(),
+                         key=lambda item: item[1].sum,
+                         reverse=True)[:8]
+        embed.add_field(
+            name="SQL by total time",
+            value="\n".join(
+                f"`{statement}` {histogram.sum * 1000:.0f} ms total · "
+                f"{timing(histogram)} · {REGISTRY.sql_rows[statement]} rows"
+                for statement, histogram in busiest) or "No data yet.",
+            inline=False)
+        await ctx.send(embed=embed)
+
+    @commands.command(name='config')
+    @commands.guild_only()
+    @commands.has_permissions(administrator=True)
+    async def configure(self, ctx, key: str = None, value: str = None):
+        """Show this server's settings, or change one.
+
+        ``!config absence_channel_id #requests`` sets a setting from a
+        mention or a raw ID; ``!config absence_channel_id none`` clears it.
+        """
+        settings = self.bot.guild_settings
+        if key is None:
+            embed = discord.Embed(title="⚙️ Server Settings", color=0x393A41)
+            for name, description in SETTINGS.items():
+                current = settings.get(ctx.guild.id, name)
+                embed.add_field(name=name,
+                                value=f"{current or 'not set'}\n"
+                                f"*{description}*",
+                                inline=False)
+            await ctx.send(embed=embed)
+            return
+
+        if key not in SETTINGS:
+            await ctx.send(f"❌ Unknown setting `{key}`. Known settings: " +
+                           ", ".join(f"`{name}`" for name in SETTINGS))
+            return
+        match = re.search(r'[0-9]{15,20}', value or '')
+        if value is None or (match is None and value.lower() != 'none'):
+            await ctx.send(
+                f"❌ Give a channel, role or ID for `{key}`, or `none`.")
+            return
+
+        new_value = int(match[0]) if match else None
+        await settings.set(ctx.guild.id, key, new_value)
+        await ctx.send(f"✅ `{key}` is now {new_value or 'not set'}.")
+
+    @commands.command(name='reload')
+    @commands.is_owner()
+    async def reload_extensions(self, ctx, name: str = 'all'):
+        """Reload one extension (``!reload scoring``) or all of them.
+
+        Only the extension code is swapped; the gateway connection, caches,
+        buffered activity and open voice sessions live on the bot and are
+        kept. Config files (rates.json, panels.json, ranks.json) are read
+        when their extension loads, so a reload also picks up edits to them.
+        A failed reload leaves the previous version loaded.
+        """
+        if name == 'all':
+            extensions = list(self.bot.extensions)
+        else:
+            extensions = [name if name.startswith('cogs.') else f'cogs.{name}']
+
+        reloaded, failed = [], []
+        for extension in extensions:
+            try:
+                if extension in self.bot.extensions:
+                    await self.bot.reload_extension(extension)
+                else:
+                    await self.bot.load_extension(extension)
+                reloaded.append(extension)
+            except commands.ExtensionError as e:
+                failed.append(f"`{extension}`: {e}")
+
+        # Only talks to Discord when a slash command actually changed
+        await self.bot.sync_commands()
+
+        lines = [f"❌ {failure}" for failure in failed]
+        if reloaded:
+            names = ", ".join(f"`{extension}`" for extension in reloaded)
+            lines.insert(0, f"🔄 Reloaded {names}")
+        await ctx.send("\n".join(lines) or "Nothing to reload.")
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(Admin(bot))
@@ -0,0 +1,111 @@
+from datetime import datetime
+
+from discord.ext import commands, tasks
+
+
+class Backups(commands.Cog):
+    """Scheduled database snapshots and restoring from them.
+
+    The primary process takes a snapshot every six hours, the first when
+    the extension loads. Snapshots cover every guild, so taking one on
+    demand and restoring one are limited to the bot's owner. A restore
+    rolls back the whole database file; processes running other shards
+    should be restarted after it so their caches are re-read.
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    async def cog_load(self):
+        self.take_snapshot.start()
+
+    async def cog_unload(self):
+        self.take_snapshot.stop()
+
+    @tasks.loop(hours=6)
+    async def take_snapshot(self):
+        # The database is shared, so one process backs it up for all
+        if not self.bot.primary:
+            return
+        try:
+            path = await self.bot.snapshots.take(datetime.utcnow())
+            print(f"[BACKUP] Wrote {path}")
+        except Exception as e:
+            print(f"Snapshot failed: {e}")
+
+    @commands.command(name='backup')
+    @commands.is_owner()
+    async def backup_now(self, ctx):
+        """Take a snapshot now, on top of the scheduled ones."""
+        path = await self.bot.snapshots.take(datetime.utcnow())
+        await ctx.send(f"✅ Saved snapshot `{path.name}`.")
+
+    @commands.command(name='backups')
+    @commands.has_permissions(administrator=True)
+    async def list_backups(self, ctx):
+        snapshots = self.bot.snapshots.paths()
+        if not snapshots:
+            await ctx.send("There are no snapshots yet.")
+            return
+        await ctx.send("\n".join(
+            f"`{path.name}` · {path.stat().st_size / 2**20:.1f} MiB"
+            for path in snapshots))
+
+    @commands.command(name='restore')
+    @commands.is_owner()
+    async def restore_backup(self, ctx, name: str):
+        """Roll the database back to a snapshot (``!restore
+        elo-20250409-180000``), then check the restored database.
+
+        Everything recorded after the snapshot was taken is lost, so a
+        fresh snapshot is taken first.
+        """
+        path = self.bot.snapshots.find(name)
+        if path is None:
+            await ctx.send(f"❌ No snapshot `{name}`. See `!backups`.")
+            return
+
+        await ctx.send(f"⏳ Restoring `{path.name}`…")
+        # Not pruned, which could delete the snapshot being restored
+        safety = await self.bot.snapshots.take(datetime.utcnow(),
+                                               prune=False)
+        # Open sessions and buffered points are settled into the database
+        # being replaced, so none of them are credited on top of the
+        # snapshot
+        await self.bot.voice_tracker.settle_all(datetime.utcnow())
+        await self.bot.activity_buffer.flush()
+        try:
+            problems = await self.bot.snapshots.restore(path)
+        except ValueError as e:
+            await ctx.send(f"❌ Nothing was restored. {e}")
+            return
+
+        await self.reload_state()
+        if problems:
+            await ctx.send(
+                f"⚠️ Restored `{path.name}`, but the integrity check "
+                f"reported:\n```\n" + "\n".join(problems[:10]) +
+                f"\n```\nThe previous state is in `{safety.name}`.")
+            return
+        await ctx.send(f"✅ Restored `{path.name}` and it passed the "
+                       f"integrity check. The previous state is in "
+                       f"`{safety.name}`.")
+
+    async def reload_state(self):
+        # Everything cached from the database is re-read from the snapshot
+        guild_ids = [guild.id for guild in self.bot.guilds]
+        await self.bot.guild_settings.load()
+        await self.bot.ticket_index.load()
+        await self.bot.leaderboard.rebuild()
+        absence = self.bot.get_cog("Absence")
+        if absence is not None:
+            await absence.breaks.load(guild_ids)
+        scoring = self.bot.get_cog("Scoring")
+        if scoring is not None:
+            self.bot.voice_tracker.loaded_guilds.clear()
+            for guild in self.bot.guilds:
+                await scoring.on_guild_ready(guild)
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(Backups(bot))
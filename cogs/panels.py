@@ -0,0 +1,44 @@
+from discord.ext import commands
+
+from panels import Panel, PanelRegistry
+
+
+def poster(panel: Panel):
+
+    async def post(ctx):
+        await panel.send(
+            ctx,
+            ctx.bot.guild_settings.values(ctx.guild.id) if ctx.guild else None)
+
+    return post
+
+
+class Panels(commands.Cog):
+    """Prefix commands that post the panels defined in panels.json."""
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.registry = PanelRegistry.load()
+        self.panel_commands: list[commands.Command] = []
+
+    async def cog_load(self):
+        # Register persistent views
+        for view in self.registry.persistent_views():
+            self.bot.add_view(view)
+
+        for name, panel in self.registry.commands.items():
+            command = commands.Command(poster(self.registry.panels[panel]),
+                                       name=name)
+            if name not in self.registry.public_commands:
+                command = commands.has_permissions(
+                    administrator=True)(command)
+            self.bot.add_command(command)
+            self.panel_commands.append(command)
+
+    async def cog_unload(self):
+        for command in self.panel_commands:
+            self.bot.remove_command(command.name)
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(Panels(bot))
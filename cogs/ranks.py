@@ -0,0 +1,68 @@
+from discord.ext import commands, tasks
+
+from database import MILLI
+from ranks import RankReconciler, RankTiers
+
+
+class Ranks(commands.Cog):
+    """Rank roles that follow ELO, by the tiers in ranks.json.
+
+    Every 15 minutes the roles of this process's guilds are reconciled
+    within one run's edit budget; whatever is left carries over to the
+    next run.
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.tiers = RankTiers.load()
+        self.reconciler = RankReconciler(bot, bot.db)
+
+    async def cog_load(self):
+        self.sync_roles.start()
+
+    async def cog_unload(self):
+        self.sync_roles.stop()
+
+    @tasks.loop(minutes=15)
+    async def sync_roles(self):
+        try:
+            made, left = await self.reconciler.run(self.bot.guilds,
+                                                   self.tiers)
+        except Exception as e:
+            print(f"Rank role sync failed: {e}")
+            return
+        if made or left:
+            print(f"[RANKS] {made} role edits made, {left} members left")
+
+    @sync_roles.before_loop
+    async def before_sync_roles(self):
+        # Roles are only known once the guilds are cached
+        await self.bot.wait_until_ready()
+
+    @commands.command(name='ranks')
+    @commands.guild_only()
+    @commands.has_permissions(administrator=True)
+    async def show_ranks(self, ctx, action: str = None):
+        """Show the rank tiers and how many members need a role change;
+        ``!ranks sync`` applies one run's worth of changes now."""
+        if action == 'sync':
+            made, left = await self.reconciler.run([ctx.guild], self.tiers)
+            await ctx.send(f"✅ Made {made} role edits; {left} members "
+                           f"still to update.")
+            return
+
+        roles = {role.name: role for _, role in self.tiers.roles(ctx.guild)}
+        lines = [
+            f"**{min_elo // MILLI:,}+** ELO · " +
+            (roles[name].mention if name in roles else
+             f"`{name}` (missing, or above the bot's role)")
+            for min_elo, name in self.tiers.tiers
+        ]
+        changes = await self.reconciler.diff(ctx.guild, self.tiers)
+        pending = sum(1 for change in changes if change.edits)
+        lines.append(f"\n{pending} members need a role change.")
+        await ctx.send("\n".join(lines))
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(Ranks(bot))
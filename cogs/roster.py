@@ -0,0 +1,66 @@
+from datetime import datetime
+
+import discord
+from discord.ext import commands
+
+from roster import FORMATS, IMPORT_SUFFIXES, export_users, read_rows
+
+
+class Roster(commands.Cog):
+    """Bulk export and import of the server's ELO, activity and breaks."""
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    @commands.command(name='export')
+    @commands.guild_only()
+    @commands.has_permissions(administrator=True)
+    async def export_roster(self, ctx, fmt: str = 'csv'):
+        """Attach every member's row as ``.csv.gz`` (default) or
+        ``.jsonl.gz`` (``!export jsonl``)."""
+        if fmt not in FORMATS:
+            await ctx.send(f"❌ Format must be one of: {', '.join(FORMATS)}.")
+            return
+        with await export_users(self.bot.db, ctx.guild.id, fmt) as file:
+            size = file.seek(0, 2)
+            if size > ctx.guild.filesize_limit:
+                await ctx.send(f"❌ The export is {size / 2**20:.1f} MiB, "
+                               f"over this server's upload limit.")
+                return
+            file.seek(0)
+            filename = f"roster-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}.gz"
+            await ctx.send(file=discord.File(file, filename=filename))
+
+    @commands.command(name='import')
+    @commands.guild_only()
+    @commands.has_permissions(administrator=True)
+    async def import_roster(self, ctx):
+        """Load an attached export back. Rows are matched on user ID and
+        replaced; members missing from the file are left as they are. The
+        file is applied in full or not at all."""
+        attachment = next(iter(ctx.message.attachments), None)
+        if attachment is None or not attachment.filename.endswith(
+                IMPORT_SUFFIXES):
+            await ctx.send("❌ Attach a file made by `!export` (" +
+                           ", ".join(IMPORT_SUFFIXES) + ").")
+            return
+
+        data = await attachment.read()
+        now = datetime.utcnow()
+        try:
+            count = await self.bot.db.import_users(
+                ctx.guild.id, read_rows(data, attachment.filename, now), now)
+        except ValueError as e:
+            await ctx.send(f"❌ Nothing was imported. {e}")
+            return
+
+        # Imported rows can move anyone on the leaderboard and carry breaks
+        await self.bot.leaderboard.rebuild([ctx.guild.id])
+        absence = self.bot.get_cog("Absence")
+        if absence is not None:
+            await absence.breaks.load([ctx.guild.id])
+        await ctx.send(f"✅ Imported {count} members.")
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(Roster(bot))
@@ -0,0 +1,272 @@
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import discord
+from discord import app_commands
+from discord.ext import commands, tasks
+
+from database import MILLI
+from members import ensure_members
+from metrics import TimedView
+from rates import RateTable
+
+TEXT_POINTS = 0.5
+
+LEDGER_KINDS = {'message': "messages", 'voice': "voice", 'decay': "decay"}
+
+
+def format_points(milli: int) -> str:
+    return f"{milli / MILLI:,.3f}".rstrip('0').rstrip('.')
+
+
+class LeaderboardView(TimedView):
+    PER_PAGE = 10
+
+    def __init__(self, leaderboard, guild_id, page=0):
+        super().__init__(timeout=300)
+        self.leaderboard = leaderboard
+        self.guild_id = guild_id
+        self.page = page
+
+    async def build_embed(self):
+        rows = await self.leaderboard.page(self.guild_id, self.page,
+                                           self.PER_PAGE)
+        embed = discord.Embed(title="🏆 Dune Reapers - Leaderboard",
+                              color=0x393A41)
+        if rows:
+            embed.description = "\n".join(
+                f"**#{rank}** <@{user_id}> – {elo} ELO"
+                for rank, user_id, elo in rows)
+        else:
+            embed.description = "No ranked members on this page."
+        embed.set_footer(text=f"Page {self.page + 1}")
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = len(rows) < self.PER_PAGE
+        return embed
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction,
+                            button: discord.ui.Button):
+        self.page = max(0, self.page - 1)
+        await interaction.response.edit_message(
+            embed=await self.build_embed(), view=self)
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction,
+                        button: discord.ui.Button):
+        self.page += 1
+        await interaction.response.edit_message(
+            embed=await self.build_embed(), view=self)
+
+    @discord.ui.button(label="My rank", style=discord.ButtonStyle.primary)
+    async def my_rank(self, interaction: discord.Interaction,
+                      button: discord.ui.Button):
+        await interaction.response.send_message(
+            await rank_message(interaction.client.db, interaction.user),
+            ephemeral=True)
+
+
+async def rank_message(db, member):
+    row = await db.get_rank(member.guild.id, member.id)
+    if row is None:
+        return "You don't have an ELO yet. Start chatting or joining voice channels!"
+    elo, rank = row
+    return f"🏆 {member.mention}, you are ranked **#{rank}** with **{elo}** ELO."
+
+
+class Scoring(commands.Cog):
+    """Text and voice activity points, decay and the standings. Voice rates
+    come from rates.json."""
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.rates = RateTable.load()
+
+    async def cog_load(self):
+        self.bot.voice_tracker.rate_for = self.rate_for
+        self.flush_activity.start()
+        self.accrue_voice.start()
+        self.check_inactivity.start()
+        self.roll_up_ledger.start()
+
+    async def cog_unload(self):
+        # stop() lets a running iteration finish, so nothing is cut off
+        # halfway through a write
+        self.flush_activity.stop()
+        self.accrue_voice.stop()
+        self.check_inactivity.stop()
+        self.roll_up_ledger.stop()
+
+    def rate_for(self, channel_id: int) -> float:
+        return self.rates.rate(channel_id, self.bot.get_channel)
+
+    @tasks.loop(seconds=5)
+    async def flush_activity(self):
+        try:
+            await self.bot.activity_buffer.flush()
+        except Exception as e:
+            print(f"Activity flush failed: {e}")
+
+    @tasks.loop(minutes=5)
+    async def accrue_voice(self):
+        try:
+            await self.bot.voice_tracker.accrue(datetime.utcnow())
+        except Exception as e:
+            print(f"Voice accrual failed: {e}")
+
+    @tasks.loop(hours=24)
+    async def check_inactivity(self):
+        # Each process decays the guilds its shards serve
+        try:
+            await self.decay([guild.id for guild in self.bot.guilds])
+        except Exception as e:
+            print(f"Inactivity decay failed: {e}")
+
+    @check_inactivity.before_loop
+    async def before_check_inactivity(self):
+        await self.bot.wait_until_ready()
+
+    async def decay(self, guild_ids: list[int]) -> None:
+        started = time.perf_counter()
+        decayed = await self.bot.db.decay_inactive(datetime.utcnow(),
+                                                   guild_ids)
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"[DECAY] {decayed} members decayed in {elapsed:.1f} ms")
+        await self.bot.leaderboard.rebuild()
+
+    @tasks.loop(minutes=10)
+    async def roll_up_ledger(self):
+        # The ledger is shared, so one process folds it for all of them
+        if not self.bot.primary:
+            return
+        try:
+            await self.bot.db.roll_up_points()
+        except Exception as e:
+            print(f"Ledger rollup failed: {e}")
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        if message.author.bot or message.guild is None:
+            return
+        if self.bot.is_shaded(message.author):
+            return
+        if not self.bot.scoring_gate.admit(message.author.id, message.channel):
+            return
+        self.bot.activity_buffer.record(message.guild.id, message.author.id,
+                                        TEXT_POINTS)
+
+    @commands.Cog.listener()
+    async def on_guild_ready(self, guild):
+        # Voice states are always cached; their members may not be
+        in_voice = {
+            member_id: channel.id
+            for channel in guild.voice_channels + guild.stage_channels
+            for member_id in channel.voice_states
+        }
+        members = await ensure_members(guild, in_voice)
+        connected = {
+            member_id: channel_id
+            for member_id, channel_id in in_voice.items()
+            if member_id not in members
+            or not self.bot.is_shaded(members[member_id])
+        }
+        await self.bot.voice_tracker.reconcile(guild.id, connected,
+                                               datetime.utcnow())
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before, after):
+        # A rename or a move to another category can change the rate
+        self.rates.forget(after.id)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        self.rates.forget(channel.id)
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(self, member, before, after):
+        now = datetime.utcnow()
+        voice_tracker = self.bot.voice_tracker
+
+        if before.channel is None and after.channel is not None:
+            if self.bot.is_shaded(member):
+                return
+            await voice_tracker.join(member.guild.id, member.id,
+                                     after.channel.id, now)
+        elif before.channel is not None and after.channel is not None:
+            if before.channel.id != after.channel.id:
+                await voice_tracker.move(member.guild.id, member.id,
+                                         after.channel.id)
+        elif before.channel is not None and after.channel is None:
+            points_earned = await voice_tracker.leave(member.guild.id,
+                                                      member.id, now)
+            if points_earned is not None:
+                print(
+                    f"[VOCALELO] {member.display_name} earned {points_earned:g} points in {before.channel.name}"
+                )
+
+    @commands.command(name='elo')
+    @commands.has_permissions(administrator=True)
+    async def check_elo(self, ctx):
+        elo = await self.bot.db.get_elo(ctx.guild.id, ctx.author.id)
+        if elo is not None:
+            await ctx.send(
+                f"🏆 {ctx.author.mention}, your current ELO is **{elo}**.")
+        else:
+            await ctx.send(
+                "You don't have an ELO yet. Start chatting or joining voice channels!"
+            )
+
+    @commands.command(name='points')
+    @commands.guild_only()
+    async def weekly_points(self, ctx):
+        """Points earned and lost since Monday, per day."""
+        today = datetime.utcnow().replace(hour=0,
+                                          minute=0,
+                                          second=0,
+                                          microsecond=0)
+        monday = today - timedelta(days=today.weekday())
+        days = defaultdict(dict)
+        totals = defaultdict(int)
+        for day, kind, amount in await self.bot.db.daily_points(
+                ctx.guild.id, ctx.author.id, monday):
+            days[day][kind] = amount
+            totals[kind] += amount
+        if not days:
+            await ctx.send(
+                f"{ctx.author.mention}, you haven't earned any points this week yet."
+            )
+            return
+
+        embed = discord.Embed(
+            title="📈 Points this week",
+            description=
+            f"{ctx.author.mention} – **{format_points(sum(totals.values()))}** points",
+            color=0x393A41)
+        for day, kinds in days.items():
+            embed.add_field(name=f"{day:%A %d-%m}",
+                            value="\n".join(
+                                f"{LEDGER_KINDS.get(kind, kind)}: "
+                                f"{format_points(amount)}"
+                                for kind, amount in kinds.items()),
+                            inline=True)
+        embed.set_footer(text=" · ".join(
+            f"{LEDGER_KINDS.get(kind, kind)} {format_points(amount)}"
+            for kind, amount in totals.items()))
+        await ctx.send(embed=embed)
+
+    @app_commands.command(name="leaderboard",
+                          description="Show the ELO standings")
+    @app_commands.guild_only()
+    @app_commands.describe(page="Page to open (10 members per page)")
+    async def leaderboard_slash_command(self,
+                                        interaction: discord.Interaction,
+                                        page: int = 1):
+        view = LeaderboardView(self.bot.leaderboard, interaction.guild_id,
+                               max(0, page - 1))
+        await interaction.response.send_message(
+            embed=await view.build_embed(), view=view)
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(Scoring(bot))
@@ -0,0 +1,321 @@
+import asyncio
+
+import discord
+from discord.ext import commands
+
+from members import ensure_members
+from metrics import TimedModal, TimedView
+from tickets import APPLICATION, TICKET
+from transcripts import SUFFIXES
+
+
+class ApplicationModal(TimedModal, title="Dune Reapers Application"):
+
+    def __init__(self):
+        super().__init__()
+        self.steam = discord.ui.TextInput(
+            label="Steam Profile URL",
+            placeholder="Please provide a direct link to your Steam profile.",
+            style=discord.TextStyle.paragraph)
+        self.WhyDR = discord.ui.TextInput(
+            label="Why Dune Reapers?",
+            placeholder=
+            "What interests you about joining Dune Reapers? Tell us what drew you to our guild.",
+            style=discord.TextStyle.paragraph)
+        self.Availability = discord.ui.TextInput(
+            label="Availability & Timezone:",
+            placeholder=
+            "What days and hours are you typically available to play? Please also include your timezone.",
+            style=discord.TextStyle.paragraph)
+        self.Background = discord.ui.TextInput(
+            label="Gaming Background:",
+            placeholder=
+            "Top games played (with hours)? Any competitive, tournaments or clan experience?",
+            style=discord.TextStyle.paragraph)
+        self.Else = discord.ui.TextInput(
+            label="Anything Else?",
+            placeholder="Anything you'd like to add? (Optional)",
+            required=False,
+            style=discord.TextStyle.paragraph)
+
+        self.add_item(self.steam)
+        self.add_item(self.WhyDR)
+        self.add_item(self.Availability)
+        self.add_item(self.Background)
+        self.add_item(self.Else)
+
+    async def on_submit(self, interaction: discord.Interaction):
+        guild = interaction.guild
+        category = interaction.client.guild_settings.channel(
+            guild, 'application_category_id')
+        ticket_index = interaction.client.ticket_index
+
+        if category is None:
+            await interaction.response.send_message(
+                "❌ Error: The application category channel was not found. Please contact an administrator.",
+                ephemeral=True)
+            return
+
+        # Channel creation can outlast the 3 second interaction deadline,
+        # so acknowledge first and report back with a follow-up
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        async with ticket_index.creating(interaction.user.id):
+            # Check existing application
+            if ticket_index.channel_id(guild.id, APPLICATION,
+                                       interaction.user.id) is not None:
+                await interaction.followup.send(
+                    "⚠️ You already have an open application.", ephemeral=True)
+                return
+
+            overwrites = {
+                guild.default_role:
+                discord.PermissionOverwrite(view_channel=False),
+                interaction.user:
+                discord.PermissionOverwrite(view_channel=True,
+                                            send_messages=True),
+            }
+            admin_role = interaction.client.role_index.role(guild, "Admin")
+            if admin_role:
+                overwrites[admin_role] = discord.PermissionOverwrite(
+                    view_channel=True, send_messages=True)
+
+            try:
+                channel = await guild.create_text_channel(
+                    name=f"{APPLICATION}-{interaction.user.name.lower()}",
+                    overwrites=overwrites,
+                    category=category)
+            except discord.HTTPException:
+                await interaction.followup.send(
+                    "❌ Error: The application channel could not be created. Please contact an administrator.",
+                    ephemeral=True)
+                return
+
+            description = (
+                f" ## {interaction.user.mention.upper()}\n ## WISHES TO JOIN OUR RANKS!\n\n"
+                f"1. **Steam Profile URL:**\n   > Answer: {self.steam.value}\n\n"
+                f"2. **Why Dune Reapers?:**\n   > Answer: {self.WhyDR.value}\n\n"
+                f"3. **Availability & Timezone:**\n   > Answer: {self.Availability.value}\n\n"
+                f"4. **Gaming Background:**\n   > Answer: {self.Background.value}\n\n"
+                f"5. **Anything Else?:**\n   > Answer: {self.Else.value or 'N/A'}\n\n"
+                f" ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎‎  ‎ ‎ ‎ ‎‎ ‎ ‎ ‎‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎‎ ‎  ‎ ‎ ‎ ‎")
+
+            # Banner, confirmation image and answers in a single message,
+            # sent while the ticket is recorded
+            banner_embed = discord.Embed(color=0x393A41)
+            banner_embed.set_image(
+                url="https://i.ibb.co/jv7bZPH4/nog-meer-naar-l.png")
+            image_embed = discord.Embed(color=0x393A41)
+            image_embed.set_image(
+                url="https://i.ibb.co/Z1tBKjDb/application-received17.png")
+            embed = discord.Embed(description=description, color=0x393A41)
+            await asyncio.gather(
+                ticket_index.add(channel, APPLICATION, interaction.user.id),
+                channel.send(embeds=[banner_embed, image_embed, embed],
+                             view=CloseTicketView()))
+
+        await interaction.followup.send(
+            f"✅ Application created: {channel.mention}", ephemeral=True)
+
+
+class CloseTicketView(TimedView):
+    """Close button posted in every ticket and application channel.
+
+    Persistent, so buttons posted before a restart keep working. Closing
+    archives the channel's transcript and then deletes it.
+    """
+
+    def __init__(self):
+        super().__init__(timeout=None)
+
+    @discord.ui.button(label="❌ Close Ticket",
+                       style=discord.ButtonStyle.danger,
+                       custom_id="close_ticket")
+    async def close(self, interaction: discord.Interaction,
+                    button: discord.ui.Button):
+        channel = interaction.channel
+        transcripts = interaction.client.transcripts
+        if channel.id in transcripts:
+            await interaction.response.send_message(
+                "⏳ This channel is already being closed.", ephemeral=True)
+            return
+
+        owner = interaction.client.ticket_index.owner(channel.id)
+        if owner is not None:
+            kind, user_id, _ = owner
+        else:
+            # Opened before indexing, or by hand: go by the name
+            kind = APPLICATION if channel.name.startswith(
+                APPLICATION) else TICKET
+            user_id = None
+
+        await interaction.response.send_message(
+            "🗄️ Saving the transcript; this channel will be deleted once "
+            "it is archived.")
+        # Written in the background, so a long channel does not hold up
+        # the answer
+        transcripts.close(channel, kind, user_id)
+
+
+class Tickets(commands.Cog):
+    """Support tickets and applications, one open channel per member.
+
+    Panels hand their buttons over to :meth:`open_ticket` and
+    :meth:`apply`, so the panel views stay valid across reloads of either
+    extension.
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    async def cog_load(self):
+        self.bot.add_view(CloseTicketView())
+
+    async def apply(self, interaction: discord.Interaction):
+        await interaction.response.send_modal(ApplicationModal())
+
+    async def open_ticket(self, interaction: discord.Interaction):
+        guild = interaction.guild
+        category = self.bot.guild_settings.channel(guild,
+                                                   'ticket_category_id')
+        admin_role_id = self.bot.guild_settings.get(guild.id, 'admin_role_id')
+        ticket_index = self.bot.ticket_index
+
+        # Acknowledge within the interaction deadline, answer once the
+        # channel is ready
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        async with ticket_index.creating(interaction.user.id):
+            if ticket_index.channel_id(guild.id, TICKET,
+                                       interaction.user.id) is not None:
+                await interaction.followup.send(
+                    "You already have an open ticket! Please close it before opening a new one.",
+                    ephemeral=True)
+                return
+
+            overwrites = {
+                guild.default_role:
+                discord.PermissionOverwrite(read_messages=False),
+                interaction.user:
+                discord.PermissionOverwrite(read_messages=True,
+                                            send_messages=True)
+            }
+
+            try:
+                ticket_channel = await guild.create_text_channel(
+                    name=f"{TICKET}-{interaction.user.name.lower()}",
+                    overwrites=overwrites,
+                    category=category)
+            except discord.HTTPException:
+                await interaction.followup.send(
+                    "❌ Error: The ticket channel could not be created. Please contact an administrator.",
+                    ephemeral=True)
+                return
+
+            description = f"**Welcome {interaction.user.mention}**"
+            if admin_role_id:
+                description += f" <@&{admin_role_id}>"
+            embed = discord.Embed(title="📬 New Ticket Opened",
+                                  description=description,
+                                  color=discord.Color.dark_teal())
+            embed.add_field(
+                name="We handle",
+                value=
+                "- 💡 Suggestions & improvements\n- 📎 Sharing tools or strategies\n- 🎥 Content or recruitment ideas\n- 🧠 Anything smart that improves the guild",
+                inline=False)
+            embed.add_field(
+                name="Reminder",
+                value=
+                "Respect the time of the team. Don’t open tickets for random questions or complaints, bring value.\n\n**Reapers don’t whine. They bring solutions.**",
+                inline=False)
+            # Welcome and close button in one message, sent while the
+            # ticket is recorded
+            await asyncio.gather(
+                ticket_index.add(ticket_channel, TICKET, interaction.user.id),
+                ticket_channel.send(embed=embed, view=CloseTicketView()))
+
+        await interaction.followup.send(
+            f"Your ticket has been created: {ticket_channel.mention}",
+            ephemeral=True)
+
+    @commands.command(name='transcripts')
+    @commands.guild_only()
+    @commands.has_permissions(administrator=True)
+    async def list_transcripts(self,
+                               ctx,
+                               member: discord.User,
+                               kind: str = None):
+        """List a member's archived tickets and applications, newest first
+        (``!transcripts @member application``)."""
+        rows = await self.bot.db.transcripts(ctx.guild.id, member.id, kind)
+        if not rows:
+            await ctx.send(f"No transcripts for {member.mention}.")
+            return
+        embed = discord.Embed(title=f"🗄️ Transcripts of {member}",
+                              color=0x393A41)
+        embed.description = "\n".join(
+            f"`{transcript_id}` #{name} · {kind} · {messages} messages · "
+            f"closed {closed_at:%Y-%m-%d}"
+            for transcript_id, name, kind, closed_at, messages, _ in rows)
+        embed.set_footer(text="!transcript <id> attaches the files")
+        await ctx.send(embed=embed)
+
+    @commands.command(name='transcript')
+    @commands.guild_only()
+    @commands.has_permissions(administrator=True)
+    async def send_transcript(self, ctx, transcript_id: int):
+        row = await self.bot.db.get_transcript(ctx.guild.id, transcript_id)
+        if row is None:
+            await ctx.send(f"❌ No transcript `{transcript_id}`.")
+            return
+        name, base = row
+        files = []
+        try:
+            for suffix in SUFFIXES:
+                files.append(discord.File(base + suffix,
+                                          filename=name + suffix))
+        except OSError:
+            # The files opened before the missing one; send closes the rest
+            for file in files:
+                file.close()
+            await ctx.send(f"❌ The files of transcript `{transcript_id}` "
+                           f"are missing.")
+            return
+        await ctx.send(files=files)
+
+    @commands.Cog.listener()
+    async def on_guild_ready(self, guild):
+        await self.bot.ticket_index.prune(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_create(self, channel):
+        # Channels opened by hand in the ticket categories are indexed too
+        ticket_index = self.bot.ticket_index
+        settings = self.bot.guild_settings
+        categories = {
+            settings.get(channel.guild.id, 'ticket_category_id'),
+            settings.get(channel.guild.id, 'application_category_id')
+        } - {None}
+        if channel.category_id not in categories or ticket_index.owner(
+                channel.id) is not None:
+            return
+        kind = next((kind for kind in (TICKET, APPLICATION)
+                     if channel.name.startswith(kind)), None)
+        member_ids = [
+            target.id for target in channel.overwrites
+            if isinstance(target, discord.Member) or (
+                isinstance(target, discord.Object)
+                and target.type is discord.Member)
+        ]
+        members = await ensure_members(channel.guild, member_ids)
+        owners = [member for member in members.values() if not member.bot]
+        if kind is not None and len(owners) == 1:
+            await ticket_index.add(channel, kind, owners[0].id)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        await self.bot.ticket_index.remove(channel.id)
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(Tickets(bot))
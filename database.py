@@ -0,0 +1,957 @@
+import asyncio
+import functools
+import json
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Optional
+
+import aiosqlite
+
+from metrics import REGISTRY
+from migrations import migrate
+
+# Statements are kept as module constants so every call passes the exact same
+# string and hits sqlite3's per-connection prepared statement cache.
+UPSERT_ACTIVITY = '''
+    INSERT INTO users (guild_id, user_id, elo_milli, last_active)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(guild_id, user_id) DO UPDATE SET
+        elo_milli = elo_milli + excluded.elo_milli,
+        last_active = MAX(COALESCE(users.last_active, 0),
+                          excluded.last_active)
+'''
+
+INSERT_LEDGER = '''
+    INSERT INTO points_ledger (guild_id, user_id, at, kind, amount)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+SET_BREAK = '''
+    INSERT INTO users (guild_id, user_id, on_break, break_start, break_end)
+    VALUES (?, ?, 1, ?, ?)
+    ON CONFLICT(guild_id, user_id) DO UPDATE SET
+        on_break = 1,
+        break_start = excluded.break_start,
+        break_end = excluded.break_end
+'''
+
+END_BREAK = '''
+    UPDATE users SET on_break = 0, break_start = NULL, break_end = NULL
+    WHERE guild_id = ? AND user_id = ?
+'''
+
+# Only the break that was scheduled; a resubmitted break has a new end.
+# Inactivity counts from the end of the break, not from before it.
+EXPIRE_BREAK = '''
+    UPDATE users
+    SET on_break = 0, break_start = NULL, break_end = NULL,
+        last_active = MAX(COALESCE(last_active, break_end), break_end)
+    WHERE guild_id = ? AND user_id = ? AND on_break = 1 AND break_end = ?
+'''
+
+SELECT_ELO = 'SELECT elo FROM users WHERE guild_id = ? AND user_id = ?'
+
+SELECT_TOP = '''
+    SELECT user_id, elo_milli FROM users WHERE guild_id = ?
+    ORDER BY elo_milli DESC, user_id LIMIT ? OFFSET ?
+'''
+
+# User IDs are bound as one JSON array, like the guild lists below
+SELECT_ELO_ABOVE = '''
+    SELECT user_id, elo_milli FROM users
+    WHERE guild_id = ? AND user_id IN (SELECT value FROM json_each(?))
+      AND elo_milli >= ?
+'''
+
+# Counts through idx_users_elo, so the cost is bounded by the rank itself
+SELECT_RANK = '''
+    SELECT u.elo,
+           (SELECT COUNT(*) FROM users
+            WHERE guild_id = u.guild_id AND elo_milli > u.elo_milli) + 1
+    FROM users AS u WHERE u.guild_id = ? AND u.user_id = ?
+'''
+
+# Guild lists are bound as one JSON array, so the statement text stays the
+# same whatever the number of guilds
+SELECT_ON_BREAK = '''
+    SELECT guild_id, user_id, break_start, break_end FROM users
+    WHERE guild_id IN (SELECT value FROM json_each(?)) AND on_break = 1
+'''
+
+OPEN_VOICE_SESSION = '''
+    INSERT OR REPLACE INTO voice_sessions
+        (guild_id, user_id, channel_id, started_at, last_seen, units_credited)
+    VALUES (?, ?, ?, ?, ?, 0)
+'''
+
+MOVE_VOICE_SESSION = '''
+    UPDATE voice_sessions SET channel_id = ? WHERE guild_id = ? AND user_id = ?
+'''
+
+SELECT_VOICE_SESSIONS = '''
+    SELECT user_id, channel_id, started_at, last_seen, units_credited
+    FROM voice_sessions WHERE guild_id = ?
+'''
+
+UPDATE_VOICE_PROGRESS = '''
+    UPDATE voice_sessions SET units_credited = ?, last_seen = ?
+    WHERE guild_id = ? AND user_id = ?
+'''
+
+DELETE_VOICE_SESSION = '''
+    DELETE FROM voice_sessions WHERE guild_id = ? AND user_id = ?
+'''
+
+INSERT_TICKET = '''
+    INSERT OR REPLACE INTO tickets
+        (channel_id, guild_id, user_id, kind, created_at)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+DELETE_TICKET = 'DELETE FROM tickets WHERE channel_id = ?'
+
+SELECT_TICKETS = 'SELECT channel_id, guild_id, user_id, kind FROM tickets'
+
+INSERT_TRANSCRIPT = '''
+    INSERT INTO transcripts (guild_id, channel_id, channel_name, user_id,
+                             kind, closed_at, messages, path)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Newest first; kind NULL matches every kind
+SELECT_TRANSCRIPTS = '''
+    SELECT id, channel_name, kind, closed_at, messages, path
+    FROM transcripts
+    WHERE guild_id = :guild_id AND user_id = :user_id
+      AND (:kind IS NULL OR kind = :kind)
+    ORDER BY closed_at DESC
+    LIMIT :limit
+'''
+
+SELECT_TRANSCRIPT = '''
+    SELECT channel_name, path FROM transcripts WHERE guild_id = ? AND id = ?
+'''
+
+SELECT_RANK_STATE = '''
+    SELECT u.user_id, u.elo_milli, r.role_id
+    FROM users AS u LEFT JOIN rank_roles AS r
+        ON r.guild_id = u.guild_id AND r.user_id = u.user_id
+    WHERE u.guild_id = ?
+'''
+
+SET_RANK_ROLE = '''
+    INSERT OR REPLACE INTO rank_roles (guild_id, user_id, role_id)
+    VALUES (?, ?, ?)
+'''
+
+DELETE_RANK_ROLE = 'DELETE FROM rank_roles WHERE guild_id = ? AND user_id = ?'
+
+SELECT_META = 'SELECT value FROM meta WHERE key = ?'
+
+SET_META = 'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)'
+
+SELECT_GUILD_SETTINGS = 'SELECT guild_id, key, value FROM guild_settings'
+
+SET_GUILD_SETTING = '''
+    INSERT OR REPLACE INTO guild_settings (guild_id, key, value)
+    VALUES (?, ?, ?)
+'''
+
+DELETE_GUILD_SETTING = '''
+    DELETE FROM guild_settings WHERE guild_id = ? AND key = ?
+'''
+
+# Inserting the marker takes the write lock, so of several processes
+# starting together only the first one claims anything
+CLAIM_LEGACY = '''
+    INSERT INTO meta (key, value) VALUES ('legacy_guild', ?)
+    ON CONFLICT(key) DO NOTHING
+'''
+
+LEGACY_TABLES = ('users', 'points_ledger', 'points_daily')
+
+# Through the primary keys, which lead with guild_id
+SELECT_HAS_LEGACY = '''
+    SELECT EXISTS (SELECT 1 FROM users WHERE guild_id = 0)
+        OR EXISTS (SELECT 1 FROM points_daily WHERE guild_id = 0)
+'''
+
+SEED_GUILD_SETTING = '''
+    INSERT OR IGNORE INTO guild_settings (guild_id, key, value)
+    VALUES (?, ?, ?)
+'''
+
+# Only rows idle for at least the grace period are visited, through
+# idx_users_break_active. Decayed rows get last_active stamped to the sweep
+# time, so a second sweep on the same day matches nothing. The ledger rows
+# are written first, in the same transaction, from the same rows.
+LEDGER_DECAY = '''
+    INSERT INTO points_ledger (guild_id, user_id, at, kind, amount)
+    SELECT guild_id, user_id, :now, 'decay', amount FROM (
+        SELECT guild_id, user_id,
+               decayed_elo(elo_milli, :now - last_active) - elo_milli AS amount
+        FROM users
+        WHERE guild_id IN (SELECT value FROM json_each(:guilds))
+          AND on_break = 0 AND last_active IS NOT NULL
+          AND last_active <= :cutoff
+    )
+    WHERE amount != 0
+'''
+
+DECAY_INACTIVE = '''
+    UPDATE users
+    SET elo_milli = decayed_elo(elo_milli, :now - last_active),
+        last_active = :now
+    WHERE guild_id IN (SELECT value FROM json_each(:guilds))
+      AND on_break = 0 AND last_active IS NOT NULL AND last_active <= :cutoff
+'''
+
+# Ledger rows up to ``:upto`` that are not rolled up yet, folded into the
+# per-day totals. The ``WHERE`` keeps the upsert from parsing as a join.
+ROLL_UP_LEDGER = '''
+    INSERT INTO points_daily (guild_id, user_id, day, kind, amount, events)
+    SELECT guild_id, user_id, at - at % 86400, kind, SUM(amount), COUNT(*)
+    FROM points_ledger WHERE id > :after AND id <= :upto
+    GROUP BY guild_id, user_id, at - at % 86400, kind
+    ON CONFLICT(guild_id, user_id, day, kind) DO UPDATE SET
+        amount = amount + excluded.amount,
+        events = events + excluded.events
+'''
+
+SELECT_LEDGER_END = 'SELECT COALESCE(MAX(id), 0) FROM points_ledger'
+
+# Rolled-up days plus the ledger tail the rollup has not reached yet, read
+# in one statement so a rollup committing in between is never counted twice
+SELECT_DAILY_POINTS = '''
+    SELECT day, kind, SUM(amount) FROM (
+        SELECT day, kind, amount FROM points_daily
+        WHERE guild_id = :guild_id AND user_id = :user_id AND day >= :since
+        UNION ALL
+        SELECT at - at % 86400, kind, amount FROM points_ledger
+        WHERE id > (SELECT COALESCE(MAX(CAST(value AS INTEGER)), 0)
+                    FROM meta WHERE key = 'ledger_rolled_up')
+          AND guild_id = :guild_id AND user_id = :user_id AND at >= :since
+    )
+    GROUP BY day, kind ORDER BY day, kind
+'''
+
+SELECT_USERS_EXPORT = '''
+    SELECT user_id, elo_milli, last_active, on_break, break_start, break_end
+    FROM users WHERE guild_id = ? ORDER BY user_id
+'''
+
+# The difference to the current ELO goes to the ledger before the row is
+# replaced; a new row counts from zero
+LEDGER_IMPORT = '''
+    INSERT INTO points_ledger (guild_id, user_id, at, kind, amount)
+    SELECT :guild_id, :user_id, :now, 'import', amount FROM (
+        SELECT :elo_milli - COALESCE(
+            (SELECT elo_milli FROM users
+             WHERE guild_id = :guild_id AND user_id = :user_id), 0) AS amount
+    )
+    WHERE amount != 0
+'''
+
+UPSERT_IMPORT = '''
+    INSERT INTO users (guild_id, user_id, elo_milli, last_active, on_break,
+                       break_start, break_end)
+    VALUES (:guild_id, :user_id, :elo_milli, :last_active, :on_break,
+            :break_start, :break_end)
+    ON CONFLICT(guild_id, user_id) DO UPDATE SET
+        elo_milli = excluded.elo_milli,
+        last_active = excluded.last_active,
+        on_break = excluded.on_break,
+        break_start = excluded.break_start,
+        break_end = excluded.break_end
+'''
+
+# Rows per fetchmany() when streaming an export
+EXPORT_BATCH = 1000
+
+INTEGRITY_CHECK = 'PRAGMA integrity_check'
+
+# Pages copied per backup step, and the pause between steps. With the
+# default 4 KiB pages a step is 1 MiB.
+BACKUP_PAGES = 256
+BACKUP_PAUSE = 0.01
+
+# Ledger rows folded per rollup transaction
+ROLLUP_BATCH = 10000
+
+# Points are stored as integer thousandths, so fractional rates add up
+# exactly
+MILLI = 1000
+
+
+def to_epoch(moment: datetime) -> int:
+    """Naive UTC datetime to the integer seconds stored in the database."""
+    return int(moment.replace(tzinfo=timezone.utc).timestamp())
+
+
+def from_epoch(seconds: int) -> datetime:
+    return datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None)
+
+
+def to_milli(points: float) -> int:
+    return round(points * MILLI)
+
+
+def decayed_elo(elo_milli: int, idle_seconds: int) -> int:
+    days_inactive = idle_seconds // 86400
+    # From day 81 the loss exceeds any ELO a 64-bit column holds, and far
+    # enough out 1.5**n overflows, which would abort the whole sweep
+    if elo_milli == 0 or days_inactive > 80:
+        return 0
+    loss = int(100 * (1.5**(days_inactive - 1)))
+    return max(0, elo_milli - loss * MILLI)
+
+
+# Rows changed by the transactions of the statement being timed; None while
+# it has not written anything
+_changes: ContextVar[Optional[int]] = ContextVar('changes', default=None)
+
+
+async def integrity_problems(db: aiosqlite.Connection) -> list[str]:
+    """Run ``PRAGMA integrity_check``; an empty list means no problems."""
+    async with db.execute(INTEGRITY_CHECK) as cursor:
+        problems = [message async for (message, ) in cursor]
+    return [] if problems == ['ok'] else problems
+
+
+def instrumented(method):
+    """Record a Database method's latency and row count in REGISTRY.
+
+    Writes count the rows their transactions changed; reads count the rows
+    they returned.
+    """
+    name = method.__name__
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        token = _changes.set(None)
+        started = time.perf_counter()
+        try:
+            result = await method(self, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            rows = _changes.get()
+            _changes.reset(token)
+        if rows is None:
+            rows = len(result) if isinstance(result, list) else int(
+                result is not None)
+        REGISTRY.observe_sql(name, elapsed, rows)
+        return result
+
+    return wrapper
+
+
+class Database:
+    """Long-lived SQLite connections shared by the whole bot.
+
+    One writer connection serialises every write transaction behind a lock,
+    and a small pool of read-only connections serves queries. WAL mode lets
+    the readers run while the writer is committing. Processes running other
+    shards may open the same file: SQLite serialises their writers too, and
+    ``busy_timeout`` makes a write wait out another process's commit.
+    """
+
+    def __init__(self, path: str, readers: int = 2):
+        self.path = path
+        self.reader_count = readers
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._readers: asyncio.Queue = asyncio.Queue()
+        self._write_lock = asyncio.Lock()
+        self.commits = 0
+        self._points_listeners: list[Callable[[list[tuple[int, str, int]]],
+                                              Awaitable[None]]] = []
+
+    def on_points(
+        self, listener: Callable[[list[tuple[int, str, int]]],
+                                 Awaitable[None]]
+    ) -> None:
+        """Register a coroutine called with ``(guild_id, user_id,
+        milli_delta)`` rows after every committed batch of point credits."""
+        self._points_listeners.append(listener)
+
+    async def _notify_points(self,
+                             deltas: list[tuple[int, str, int]]) -> None:
+        if deltas:
+            for listener in self._points_listeners:
+                await listener(deltas)
+
+    async def connect(self) -> None:
+        self._writer = await aiosqlite.connect(self.path,
+                                               cached_statements=256)
+        await self._writer.execute('PRAGMA journal_mode=WAL')
+        await self._writer.execute('PRAGMA synchronous=NORMAL')
+        await self._writer.execute('PRAGMA busy_timeout=5000')
+        await self._writer.create_function('decayed_elo',
+                                           2,
+                                           decayed_elo,
+                                           deterministic=True)
+        await migrate(self._writer)
+
+        for _ in range(self.reader_count):
+            reader = await aiosqlite.connect(f'file:{self.path}?mode=ro',
+                                             uri=True,
+                                             cached_statements=256)
+            await reader.execute('PRAGMA query_only=ON')
+            self._readers.put_nowait(reader)
+
+    @property
+    def total_changes(self) -> int:
+        """Rows inserted, updated or deleted through the writer so far."""
+        return self._writer.total_changes if self._writer else 0
+
+    async def close(self) -> None:
+        while not self._readers.empty():
+            await self._readers.get_nowait().close()
+        if self._writer is not None:
+            await self._writer.close()
+            self._writer = None
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[aiosqlite.Connection]:
+        async with self._write_lock:
+            before = self._writer.total_changes
+            try:
+                yield self._writer
+            except BaseException:
+                await self._writer.rollback()
+                raise
+            await self._writer.commit()
+            self.commits += 1
+            _changes.set((_changes.get() or 0) + self._writer.total_changes -
+                         before)
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        conn = await self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put_nowait(conn)
+
+    @instrumented
+    async def apply_activity(self,
+                             rows: list[tuple[int, str, int, datetime]],
+                             kind: str = 'message') -> None:
+        """Credit ``(guild_id, user_id, milli_points, last_active)`` rows
+        and write them to the ledger as ``kind``."""
+        async with self.transaction() as db:
+            await db.executemany(UPSERT_ACTIVITY,
+                                 [(guild_id, user_id, points,
+                                   to_epoch(last_active))
+                                  for guild_id, user_id, points, last_active
+                                  in rows])
+            await db.executemany(INSERT_LEDGER,
+                                 [(guild_id, user_id, to_epoch(last_active),
+                                   kind, points)
+                                  for guild_id, user_id, points, last_active
+                                  in rows if points])
+        await self._notify_points([(guild_id, user_id, points)
+                                   for guild_id, user_id, points, _ in rows])
+
+    @instrumented
+    async def set_break(self, guild_id: int, user_id: int, start: datetime,
+                        end: datetime) -> None:
+        async with self.transaction() as db:
+            await db.execute(SET_BREAK, (guild_id, str(user_id),
+                                         to_epoch(start), to_epoch(end)))
+        # May have created the user's row with the default ELO
+        await self._notify_points([(guild_id, str(user_id), 0)])
+
+    @instrumented
+    async def end_break(self, guild_id: int, user_id: int) -> None:
+        async with self.transaction() as db:
+            await db.execute(END_BREAK, (guild_id, str(user_id)))
+
+    @instrumented
+    async def expire_breaks(
+            self, breaks: list[tuple[int, str,
+                                     datetime]]) -> list[tuple[int, str]]:
+        """End the given ``(guild_id, user_id, break_end)`` breaks in one
+        transaction and return the ``(guild_id, user_id)`` pairs whose break
+        was still the scheduled one."""
+        expired = []
+        async with self.transaction() as db:
+            for guild_id, user_id, end in breaks:
+                cursor = await db.execute(EXPIRE_BREAK,
+                                          (guild_id, user_id, to_epoch(end)))
+                if cursor.rowcount:
+                    expired.append((guild_id, user_id))
+        return expired
+
+    @instrumented
+    async def get_elo(self, guild_id: int, user_id: int) -> Optional[int]:
+        async with self.reader() as db:
+            async with db.execute(SELECT_ELO,
+                                  (guild_id, str(user_id))) as cursor:
+                row = await cursor.fetchone()
+        return row[0] if row else None
+
+    @instrumented
+    async def top_users(self,
+                        guild_id: int,
+                        limit: int,
+                        offset: int = 0) -> list[tuple[str, int]]:
+        """Return ``(user_id, elo_milli)`` rows, highest first."""
+        async with self.reader() as db:
+            async with db.execute(SELECT_TOP,
+                                  (guild_id, limit, offset)) as cursor:
+                return list(await cursor.fetchall())
+
+    @instrumented
+    async def users_at_least(self, guild_id: int, user_ids: list[str],
+                             elo_milli: int) -> list[tuple[str, int]]:
+        async with self.reader() as db:
+            async with db.execute(SELECT_ELO_ABOVE,
+                                  (guild_id, json.dumps(user_ids),
+                                   elo_milli)) as cursor:
+                return list(await cursor.fetchall())
+
+    @instrumented
+    async def get_rank(self, guild_id: int,
+                       user_id: int) -> Optional[tuple[int, int]]:
+        """Return ``(elo, rank)`` for a user, or None if they have no row."""
+        async with self.reader() as db:
+            async with db.execute(SELECT_RANK,
+                                  (guild_id, str(user_id))) as cursor:
+                return await cursor.fetchone()
+
+    @instrumented
+    async def users_on_break(
+        self, guild_ids: list[int]
+    ) -> list[tuple[int, str, Optional[datetime], Optional[datetime]]]:
+        async with self.reader() as db:
+            async with db.execute(SELECT_ON_BREAK,
+                                  (json.dumps(guild_ids), )) as cursor:
+                return [(guild_id, user_id,
+                         from_epoch(start) if start else None,
+                         from_epoch(end) if end else None)
+                        async for guild_id, user_id, start, end in cursor]
+
+    @instrumented
+    async def open_voice_session(self, guild_id: int, user_id: int,
+                                 channel_id: int, now: datetime) -> None:
+        async with self.transaction() as db:
+            await db.execute(OPEN_VOICE_SESSION,
+                             (guild_id, str(user_id), channel_id,
+                              to_epoch(now), to_epoch(now)))
+
+    @instrumented
+    async def move_voice_session(self, guild_id: int, user_id: int,
+                                 channel_id: int) -> None:
+        async with self.transaction() as db:
+            await db.execute(MOVE_VOICE_SESSION,
+                             (channel_id, guild_id, str(user_id)))
+
+    @instrumented
+    async def voice_sessions(
+            self,
+            guild_id: int) -> list[tuple[str, int, datetime, datetime, int]]:
+        async with self.reader() as db:
+            async with db.execute(SELECT_VOICE_SESSIONS,
+                                  (guild_id, )) as cursor:
+                return [(user_id, channel_id, from_epoch(started_at),
+                         from_epoch(last_seen), units)
+                        async for (user_id, channel_id, started_at,
+                                   last_seen, units) in cursor]
+
+    @instrumented
+    async def credit_voice(self,
+                           credits: list[tuple[int, str, int, int, datetime]],
+                           closed: list[tuple[int, str]] = ()) -> None:
+        """Credit accrued voice points and session progress atomically.
+
+        ``credits`` holds ``(guild_id, user_id, milli_points,
+        units_credited, now)`` rows; sessions listed in ``closed`` as
+        ``(guild_id, user_id)`` are removed in the same transaction.
+        """
+        async with self.transaction() as db:
+            await db.executemany(UPSERT_ACTIVITY,
+                                 [(guild_id, user_id, points, to_epoch(now))
+                                  for guild_id, user_id, points, _, now
+                                  in credits])
+            await db.executemany(INSERT_LEDGER,
+                                 [(guild_id, user_id, to_epoch(now), 'voice',
+                                   points)
+                                  for guild_id, user_id, points, _, now
+                                  in credits if points])
+            await db.executemany(UPDATE_VOICE_PROGRESS,
+                                 [(units, to_epoch(now), guild_id, user_id)
+                                  for guild_id, user_id, _, units, now
+                                  in credits])
+            await db.executemany(DELETE_VOICE_SESSION, closed)
+        await self._notify_points([(guild_id, user_id, points)
+                                   for guild_id, user_id, points, _, _
+                                   in credits])
+
+    @instrumented
+    async def add_ticket(self, channel_id: int, guild_id: int, user_id: int,
+                         kind: str, now: datetime) -> None:
+        async with self.transaction() as db:
+            await db.execute(INSERT_TICKET, (channel_id, guild_id,
+                                             str(user_id), kind, to_epoch(now)))
+
+    @instrumented
+    async def remove_tickets(self, channel_ids: list[int]) -> None:
+        async with self.transaction() as db:
+            await db.executemany(DELETE_TICKET,
+                                 [(channel_id, ) for channel_id in channel_ids])
+
+    @instrumented
+    async def tickets(self) -> list[tuple[int, int, str, str]]:
+        async with self.reader() as db:
+            async with db.execute(SELECT_TICKETS) as cursor:
+                return list(await cursor.fetchall())
+
+    @instrumented
+    async def add_transcript(self, guild_id: int, channel_id: int,
+                             channel_name: str, user_id: Optional[int],
+                             kind: str, closed_at: datetime, messages: int,
+                             path: str) -> None:
+        async with self.transaction() as db:
+            await db.execute(
+                INSERT_TRANSCRIPT,
+                (guild_id, channel_id, channel_name,
+                 None if user_id is None else str(user_id), kind,
+                 to_epoch(closed_at), messages, path))
+
+    @instrumented
+    async def transcripts(
+            self,
+            guild_id: int,
+            user_id: int,
+            kind: Optional[str] = None,
+            limit: int = 25
+    ) -> list[tuple[int, str, str, datetime, int, str]]:
+        """Return ``(id, channel_name, kind, closed_at, messages, path)``
+        for a member's archived channels, newest first."""
+        params = {
+            'guild_id': guild_id,
+            'user_id': str(user_id),
+            'kind': kind,
+            'limit': limit
+        }
+        async with self.reader() as db:
+            async with db.execute(SELECT_TRANSCRIPTS, params) as cursor:
+                return [(transcript_id, name, kind, from_epoch(closed_at),
+                         messages, path)
+                        async for transcript_id, name, kind, closed_at,
+                        messages, path in cursor]
+
+    @instrumented
+    async def get_transcript(self, guild_id: int,
+                             transcript_id: int) -> Optional[tuple[str, str]]:
+        """Return ``(channel_name, path)`` of one of the guild's
+        transcripts."""
+        async with self.reader() as db:
+            async with db.execute(SELECT_TRANSCRIPT,
+                                  (guild_id, transcript_id)) as cursor:
+                return await cursor.fetchone()
+
+    @instrumented
+    async def rank_state(
+            self, guild_id: int) -> list[tuple[str, int, Optional[int]]]:
+        """Return ``(user_id, elo_milli, role_id)`` for every member of a
+        guild with an ELO, ``role_id`` being the rank role last recorded
+        by :meth:`set_rank_roles`."""
+        async with self.reader() as db:
+            async with db.execute(SELECT_RANK_STATE, (guild_id, )) as cursor:
+                return list(await cursor.fetchall())
+
+    @instrumented
+    async def set_rank_roles(
+            self, guild_id: int,
+            roles: list[tuple[str, Optional[int]]]) -> None:
+        """Record ``(user_id, role_id)`` rank roles; None records that the
+        member has none."""
+        async with self.transaction() as db:
+            await db.executemany(SET_RANK_ROLE,
+                                 [(guild_id, user_id, role_id)
+                                  for user_id, role_id in roles
+                                  if role_id is not None])
+            await db.executemany(DELETE_RANK_ROLE,
+                                 [(guild_id, user_id)
+                                  for user_id, role_id in roles
+                                  if role_id is None])
+
+    @instrumented
+    async def get_meta(self, key: str) -> Optional[str]:
+        async with self.reader() as db:
+            async with db.execute(SELECT_META, (key, )) as cursor:
+                row = await cursor.fetchone()
+        return row[0] if row else None
+
+    @instrumented
+    async def set_meta(self, key: str, value: str) -> None:
+        async with self.transaction() as db:
+            await db.execute(SET_META, (key, value))
+
+    @instrumented
+    async def guild_settings(self) -> list[tuple[int, str, int]]:
+        async with self.reader() as db:
+            async with db.execute(SELECT_GUILD_SETTINGS) as cursor:
+                return list(await cursor.fetchall())
+
+    @instrumented
+    async def set_guild_setting(self, guild_id: int, key: str,
+                                value: Optional[int]) -> None:
+        async with self.transaction() as db:
+            if value is None:
+                await db.execute(DELETE_GUILD_SETTING, (guild_id, key))
+            else:
+                await db.execute(SET_GUILD_SETTING, (guild_id, key, value))
+
+    @instrumented
+    async def has_legacy_rows(self) -> bool:
+        """Whether rows written before guilds were tracked are unclaimed."""
+        async with self.reader() as db:
+            async with db.execute(SELECT_HAS_LEGACY) as cursor:
+                (found, ) = await cursor.fetchone()
+        return bool(found)
+
+    @instrumented
+    async def claim_legacy_rows(self, guild_id: int,
+                                settings: dict[str, int]) -> int:
+        """Move rows written before guilds were tracked to ``guild_id`` and
+        seed its settings. Runs once per database; returns the rows moved.
+        """
+        moved = 0
+        async with self.transaction() as db:
+            cursor = await db.execute(CLAIM_LEGACY, (str(guild_id), ))
+            if not cursor.rowcount:
+                return 0
+            for table in LEGACY_TABLES:
+                cursor = await db.execute(
+                    f'UPDATE {table} SET guild_id = ? WHERE guild_id = 0',
+                    (guild_id, ))
+                moved += cursor.rowcount
+            await db.executemany(SEED_GUILD_SETTING,
+                                 [(guild_id, key, value)
+                                  for key, value in settings.items()])
+        return moved
+
+    async def export_users(
+        self, guild_id: int
+    ) -> AsyncIterator[list[tuple[str, int, Optional[int], int, Optional[int],
+                                  Optional[int]]]]:
+        """Yield a guild's ``users`` rows in batches of ``EXPORT_BATCH``,
+        timestamps as epoch seconds, so the table is never held in memory.
+        A reader connection stays checked out until the iteration ends."""
+        async with self.reader() as db:
+            async with db.execute(SELECT_USERS_EXPORT, (guild_id, )) as cursor:
+                while True:
+                    rows = await cursor.fetchmany(EXPORT_BATCH)
+                    if not rows:
+                        return
+                    yield rows
+
+    @instrumented
+    async def import_users(self, guild_id: int,
+                           batches: Iterable[list[dict]],
+                           now: datetime) -> int:
+        """Upsert batches of ``users`` rows for a guild in one transaction.
+
+        Rows are dicts with ``user_id``, ``elo_milli``, ``last_active``,
+        ``on_break``, ``break_start`` and ``break_end``, timestamps as epoch
+        seconds. ELO changes are written to the ledger as ``import``. An
+        exception from ``batches`` rolls the whole import back. Returns the
+        number of rows imported.
+        """
+        count = 0
+        async with self.transaction() as db:
+            for batch in batches:
+                rows = [{
+                    **row, 'guild_id': guild_id,
+                    'now': to_epoch(now)
+                } for row in batch]
+                await db.executemany(LEDGER_IMPORT, rows)
+                await db.executemany(UPSERT_IMPORT, rows)
+                count += len(rows)
+        return count
+
+    @instrumented
+    async def decay_inactive(self,
+                             now: datetime,
+                             guild_ids: list[int],
+                             grace_days: int = 3) -> int:
+        """Apply ELO decay to everyone in ``guild_ids`` idle for
+        ``grace_days`` or more.
+
+        Returns the number of rows that were decayed.
+        """
+        params = {
+            'now': to_epoch(now),
+            'cutoff': to_epoch(now - timedelta(days=grace_days)),
+            'guilds': json.dumps(guild_ids),
+        }
+        async with self.transaction() as db:
+            await db.execute(LEDGER_DECAY, params)
+            cursor = await db.execute(DECAY_INACTIVE, params)
+            return cursor.rowcount
+
+    @instrumented
+    async def roll_up_points(self) -> int:
+        """Fold new ledger rows into ``points_daily``, at most
+        ``ROLLUP_BATCH`` per transaction. Returns the rows folded.
+
+        The progress is read outside the write transaction, so only one
+        process may run this against a database.
+        """
+        async with self.reader() as db:
+            async with db.execute(SELECT_LEDGER_END) as cursor:
+                (end, ) = await cursor.fetchone()
+        after = int(await self.get_meta('ledger_rolled_up') or 0)
+        folded = 0
+        while after < end:
+            upto = min(end, after + ROLLUP_BATCH)
+            async with self.transaction() as db:
+                await db.execute(ROLL_UP_LEDGER, {
+                    'after': after,
+                    'upto': upto
+                })
+                await db.execute(SET_META, ('ledger_rolled_up', str(upto)))
+            folded += upto - after
+            after = upto
+        return folded
+
+    @instrumented
+    async def daily_points(self, guild_id: int, user_id: int,
+                           since: datetime) -> list[tuple[datetime, str, int]]:
+        """Return ``(day, kind, milli_points)`` totals for a user from
+        ``since`` on, oldest day first."""
+        params = {
+            'guild_id': guild_id,
+            'user_id': str(user_id),
+            'since': to_epoch(since)
+        }
+        async with self.reader() as db:
+            async with db.execute(SELECT_DAILY_POINTS, params) as cursor:
+                return [(from_epoch(day), kind, amount)
+                        async for day, kind, amount in cursor]
+
+    @instrumented
+    async def backup(self, path: str) -> None:
+        """Copy the database to a new file at ``path`` while the bot keeps
+        using it.
+
+        The copy runs on a connection of its own, ``BACKUP_PAGES`` at a time
+        with a short pause between steps, so neither the event loop nor the
+        writer waits on it. It reads inside a single transaction: WAL keeps
+        that snapshot intact while commits carry on, so the copy is
+        consistent and is never restarted by a write.
+        """
+        async with aiosqlite.connect(f'file:{self.path}?mode=ro',
+                                     uri=True) as source:
+            async with aiosqlite.connect(path) as target:
+                await source.execute('BEGIN')
+                await source.execute('SELECT COUNT(*) FROM sqlite_master')
+                await source.backup(target,
+                                    pages=BACKUP_PAGES,
+                                    sleep=BACKUP_PAUSE)
+                await source.rollback()
+                # A self-contained file, with no -wal or -shm beside it
+                await target.execute('PRAGMA journal_mode=DELETE')
+
+    @instrumented
+    async def restore(self, path: str) -> None:
+        """Replace the whole database with the one at ``path``.
+
+        The pages are copied into the writer inside one write transaction,
+        so readers, and other processes sharing the file, see either the
+        old contents or the restored ones. A snapshot from an older schema
+        is migrated afterwards.
+        """
+        async with self._write_lock:
+            async with aiosqlite.connect(f'file:{path}?mode=ro',
+                                         uri=True) as source:
+                await source.backup(self._writer)
+            await migrate(self._writer)
+            self.commits += 1
+
+    async def integrity_check(self) -> list[str]:
+        """Problems ``PRAGMA integrity_check`` finds in the live database;
+        empty when there are none."""
+        async with self.reader() as db:
+            return await integrity_problems(db)
+
+
+class ActivityBuffer:
+    """Coalesces per-event ELO and activity writes into batched upserts.
+
+    Every message or voice session only touches an in-memory dict keyed by
+    ``(guild_id, user_id)``. Pending rows are written with one
+    ``executemany`` in a single transaction, either by the periodic flush
+    task or as soon as ``max_pending`` events have been recorded. Points are
+    summed in milli-points and written to the ledger as ``kind``.
+    """
+
+    def __init__(self,
+                 db: Database,
+                 max_pending: int = 100,
+                 kind: str = 'message'):
+        self.db = db
+        self.max_pending = max_pending
+        self.kind = kind
+        # (guild_id, user_id) -> [milli_points, last_active]
+        self._pending = {}
+        self._events = 0
+        self._lock = asyncio.Lock()
+        self._flush_task = None
+        self.flushed_rows = 0
+        self.flushed_events = 0
+        self.flushes = 0
+
+    @property
+    def pending_rows(self) -> int:
+        return len(self._pending)
+
+    @property
+    def pending_events(self) -> int:
+        return self._events
+
+    def record(self,
+               guild_id: int,
+               user_id: int,
+               points: float = 0,
+               when: Optional[datetime] = None) -> None:
+        self._add((guild_id, str(user_id)), to_milli(points), when
+                  or datetime.utcnow())
+        self._events += 1
+        if self._events >= self.max_pending and not self._lock.locked() and (
+                self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self.flush())
+
+    def _add(self, key: tuple[int, str], points: int, when: datetime) -> None:
+        entry = self._pending.get(key)
+        if entry is None:
+            self._pending[key] = [points, when]
+        else:
+            entry[0] += points
+            entry[1] = max(entry[1], when)
+
+    async def flush(self) -> int:
+        async with self._lock:
+            if not self._pending:
+                return 0
+            batch, events = self._pending, self._events
+            self._pending, self._events = {}, 0
+            rows = [(guild_id, user_id, points, last_active)
+                    for (guild_id, user_id), (points,
+                                              last_active) in batch.items()]
+            try:
+                await self.db.apply_activity(rows, self.kind)
+            except BaseException:
+                # Put the batch back so the next flush retries it
+                for key, (points, last_active) in batch.items():
+                    self._add(key, points, last_active)
+                self._events += events
+                raise
+            self.flushed_rows += len(rows)
+            self.flushed_events += events
+            self.flushes += 1
+            return len(rows)
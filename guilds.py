@@ -0,0 +1,72 @@
+from typing import Optional
+
+import discord
+
+from database import Database
+
+# Every per-guild setting is a channel, category or role ID
+SETTINGS = {
+    'ticket_category_id': "Category new tickets are opened in",
+    'application_category_id': "Category new applications are opened in",
+    'admin_role_id': "Role mentioned on new tickets",
+    'absence_channel_id': "Channel absence requests are posted to",
+    'diplomacy_channel_id': "Channel the Diplomacy button points to",
+    'about_channel_id': "Channel the About us button points to",
+    'council_channel_id': "Channel the Reapers Council link opens",
+    'direction_channel_id': "Channel the Direction Logs link opens",
+}
+
+# The IDs the bot was written against, given to HOME_GUILD_ID when it
+# claims the data from before guilds were tracked
+LEGACY_SETTINGS = {
+    'ticket_category_id': 1360256145918263407,
+    'application_category_id': 1360256145918263407,
+    'admin_role_id': 1357822236039446748,
+    'absence_channel_id': 1359477781288845372,
+    'diplomacy_channel_id': 1361059575654252647,
+    'about_channel_id': 1354238210485518407,
+    'council_channel_id': 1355332092418068560,
+    'direction_channel_id': 1355332142825210229,
+}
+
+
+class GuildSettings:
+    """Per-guild channel and role IDs from the ``guild_settings`` table.
+
+    The table is read once at startup and every lookup is served from
+    memory. Each guild is handled by a single shard, so the process that
+    changes a setting is the only one that reads it.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+        self._values: dict[int, dict[str, int]] = {}
+
+    async def load(self) -> None:
+        self._values.clear()
+        for guild_id, key, value in await self.db.guild_settings():
+            self._values.setdefault(guild_id, {})[key] = value
+
+    def get(self, guild_id: int, key: str) -> Optional[int]:
+        return self._values.get(guild_id, {}).get(key)
+
+    def channel(self, guild: discord.Guild,
+                key: str) -> Optional[discord.abc.GuildChannel]:
+        channel_id = self.get(guild.id, key)
+        return guild.get_channel(channel_id) if channel_id else None
+
+    def values(self, guild_id: int) -> dict[str, int]:
+        """The guild's settings plus ``guild_id``, for formatting panel
+        text and links."""
+        return {'guild_id': guild_id, **self._values.get(guild_id, {})}
+
+    async def set(self, guild_id: int, key: str,
+                  value: Optional[int]) -> None:
+        if key not in SETTINGS:
+            raise KeyError(key)
+        await self.db.set_guild_setting(guild_id, key, value)
+        settings = self._values.setdefault(guild_id, {})
+        if value is None:
+            settings.pop(key, None)
+        else:
+            settings[key] = value
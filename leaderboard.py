@@ -0,0 +1,79 @@
+from collections import defaultdict
+from typing import Optional
+
+from database import MILLI, Database
+
+
+class Leaderboard:
+    """In-memory cache of the top ``size`` users by ELO, per guild.
+
+    A guild's cache is read on its first page and afterwards point credits
+    are folded in incrementally through :meth:`Database.on_points`; anything
+    that can lower ELO (the decay sweep) calls :meth:`rebuild`. Pages past
+    the cached range and rank lookups go to the database through
+    ``idx_users_elo``. ELO is held in milli-points, like the table, and only
+    rounded down for display.
+    """
+
+    def __init__(self, db: Database, size: int = 100):
+        self.db = db
+        self.size = size
+        self._elo: dict[int, dict[str, int]] = {}
+        self._ranked: dict[int, list[tuple[str, int]]] = {}
+        db.on_points(self.apply)
+
+    async def rebuild(self, guild_ids: Optional[list[int]] = None) -> None:
+        """Re-read the given guilds, or every guild cached so far."""
+        for guild_id in list(self._elo if guild_ids is None else guild_ids):
+            self._elo[guild_id] = dict(await self.db.top_users(
+                guild_id, self.size))
+            self._ranked.pop(guild_id, None)
+
+    def ranked(self, guild_id: int) -> list[tuple[str, int]]:
+        ranked = self._ranked.get(guild_id)
+        if ranked is None:
+            ranked = self._ranked[guild_id] = sorted(
+                self._elo.get(guild_id, {}).items(),
+                key=lambda item: (-item[1], item[0]))
+        return ranked
+
+    async def apply(self, deltas: list[tuple[int, str, int]]) -> None:
+        outsiders = defaultdict(list)
+        for guild_id, user_id, points in deltas:
+            elo = self._elo.get(guild_id)
+            if elo is None:
+                # Read in full when the guild's leaderboard is first shown
+                continue
+            if user_id in elo:
+                elo[user_id] += points
+            else:
+                outsiders[guild_id].append(user_id)
+            self._ranked.pop(guild_id, None)
+
+        for guild_id, user_ids in outsiders.items():
+            elo = self._elo[guild_id]
+            # Only users that can now make the cut need their ELO read back
+            floor = self.ranked(guild_id)[-1][1] if len(
+                elo) >= self.size else -2**63
+            for user_id, points in await self.db.users_at_least(
+                    guild_id, user_ids, floor):
+                elo[user_id] = points
+            self._ranked.pop(guild_id, None)
+            if len(elo) > self.size:
+                self._elo[guild_id] = dict(self.ranked(guild_id)[:self.size])
+                self._ranked.pop(guild_id, None)
+
+    async def page(self,
+                   guild_id: int,
+                   page: int,
+                   per_page: int = 10) -> list[tuple[int, str, int]]:
+        """Return ``(rank, user_id, elo)`` rows for a 0-based page."""
+        start = page * per_page
+        if start + per_page <= self.size:
+            if guild_id not in self._elo:
+                await self.rebuild([guild_id])
+            rows = self.ranked(guild_id)[start:start + per_page]
+        else:
+            rows = await self.db.top_users(guild_id, per_page, start)
+        return [(start + i + 1, user_id, elo // MILLI)
+                for i, (user_id, elo) in enumerate(rows)]
@@ -1,19 +1,75 @@
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
+import asyncio
+import hashlib
+import json
 import os
+import time
 from dotenv import load_dotenv
-import aiosqlite
-from datetime import datetime, timedelta
-
-
-# Check if member has the "Shade" role
-async def is_shaded(member: discord.Member) -> bool:
-    return any(role.name == "Shade" for role in member.roles)
-
+from datetime import datetime
+from typing import Optional
+
+from backups import Snapshots
+from database import ActivityBuffer, Database
+from guilds import LEGACY_SETTINGS, GuildSettings
+from leaderboard import Leaderboard
+from members import UserResolver
+from metrics import (REGISTRY, TimedCommandTree, observe_app_command,
+                     rss_bytes, sample_loop_lag, serve)
+from roles import RoleIndex
+from throttle import ScoringGate
+from tickets import TicketIndex
+from transcripts import TranscriptArchive
+from voice import VoiceTracker
 
 # Load environment variables
 load_dotenv()
 TOKEN = os.getenv('TOKEN_BOT_DC')
+# Prometheus text endpoint on localhost; set to 0 to disable
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))
+# Skip member chunking at login and the message cache; set to 0 to restore
+# discord.py's defaults
+LOW_MEMORY = os.getenv('LOW_MEMORY', '1') != '0'
+# Scoring limits: messages per minute that earn points after a burst, and
+# comma-separated channel or category IDs to score exclusively / never
+SCORING_PER_MINUTE = float(os.getenv('SCORING_PER_MINUTE', '6'))
+SCORING_BURST = float(os.getenv('SCORING_BURST', '5'))
+# Guild that takes over the data stored before guilds were tracked; when
+# unset, the only guild the bot is in does
+HOME_GUILD_ID = int(os.getenv('HOME_GUILD_ID') or 0)
+# Where database snapshots are written, and how many are kept
+BACKUP_DIR = os.getenv('BACKUP_DIR', 'backups')
+BACKUP_KEEP = int(os.getenv('BACKUP_KEEP') or 14)
+# Where transcripts of closed tickets and applications are written
+TRANSCRIPT_DIR = os.getenv('TRANSCRIPT_DIR', 'transcripts')
+
+
+def id_set(name: str) -> set[int]:
+    return {
+        int(part)
+        for part in os.getenv(name, '').split(',') if part.strip()
+    }
+
+
+def shard_ids(value: str) -> Optional[list[int]]:
+    """Parse ``"0-3,6"`` into ``[0, 1, 2, 3, 6]``; empty means all."""
+    ids = []
+    for part in value.split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            ids.extend(range(int(first), int(last) + 1))
+        elif part.strip():
+            ids.append(int(part))
+    return ids or None
+
+
+# Sharding: leave both unset to let Discord pick the shard count and run
+# every shard here. To split shards over processes give every process the
+# same SHARD_COUNT and its own SHARD_IDS range (and METRICS_PORT); they can
+# share one database file.
+SHARD_COUNT = int(os.getenv('SHARD_COUNT') or 0) or None
+SHARD_IDS = shard_ids(os.getenv('SHARD_IDS', ''))
+
 
 # Discord Intents
 intents = discord.Intents.default()
@@ -23,801 +79,242 @@ intents.voice_states = True
 intents.members = True
 intents.message_content = True
 
-# Create bot instance
-bot = commands.Bot(command_prefix='!', intents=intents)
-
-# Track voice sessions
-voice_sessions = {}
-
-TEXT_POINTS = 0.5
-
-ABSENCE_REQUEST_CHANNEL_ID = 1359477781288845372
-TICKET_CATEGORY_ID = 1360256145918263407
-ADMIN_ROLE_ID = 1357822236039446748
-
-
-@bot.event
-async def on_ready():
-    bot.add_view(WelcomePanelView4())
-    print(f"{bot.user} is online.")
-    await initialize_database()
-    check_inactivity.start()
-
-    # Register persistent views
-    bot.add_view(CommandPanelView())
-    try:
-        synced = await bot.tree.sync()
-        print(f"Synced {len(synced)} slash commands")
-    except Exception as e:
-        print(f"Slash command sync failed: {e}")
-
-
-async def initialize_database():
-    async with aiosqlite.connect('elo_database.db') as db:
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                user_id TEXT PRIMARY KEY,
-                elo INTEGER DEFAULT 1000,
-                last_active TIMESTAMP,
-                on_break INTEGER DEFAULT 0,
-                break_start TIMESTAMP,
-                break_end TIMESTAMP
-            )
-        ''')
-        await db.commit()
-
-
-async def update_user_activity(user_id):
-    now = datetime.utcnow()
-    async with aiosqlite.connect('elo_database.db') as db:
-        await db.execute(
-            '''
-            INSERT INTO users (user_id, last_active)
-            VALUES (?, ?)
-            ON CONFLICT(user_id) DO UPDATE SET last_active = excluded.last_active
-        ''', (str(user_id), now))
-        await db.commit()
-
-
-async def add_points(user_id, points):
-    async with aiosqlite.connect('elo_database.db') as db:
-        await db.execute(
-            '''
-            INSERT INTO users (user_id, elo, last_active)
-            VALUES (?, ?, ?)
-            ON CONFLICT(user_id) DO UPDATE SET elo = elo + ?
-        ''', (str(user_id), int(points), datetime.utcnow(), int(points)))
-        await db.commit()
-
-
-@bot.event
-async def on_message(message):
-    if message.author.bot:
-        return
-    if await is_shaded(message.author):
-        return
-    await add_points(message.author.id, TEXT_POINTS)
-    await update_user_activity(message.author.id)
-    await bot.process_commands(message)
-
-
-@bot.event
-async def on_ready():
-    bot.add_view(WelcomePanelView4())
-    print(f"{bot.user} is now online.")
-
-
-@bot.command()
-async def applypanel(ctx):
-    view = WelcomePanelView4()
-    await view.send(ctx)
-
-
-@bot.event
-async def on_voice_state_update(member, before, after):
-    now = datetime.utcnow()
-    user_id = str(member.id)
-    if await is_shaded(member):
-        return
-
-    if before.channel is None and after.channel is not None:
-        voice_sessions[user_id] = (after.channel.id, now)
-    elif before.channel is not None and after.channel is None:
-        if user_id in voice_sessions:
-            _, start_time = voice_sessions.pop(user_id)
-            minutes_spent = max(1, int(
-                (now - start_time).total_seconds() / 300))
-            channel = before.channel
-            channel_name = ''.join(filter(
-                str.isalpha, channel.name.lower())) if channel else ""
-
-            if channel_name.startswith("Operation"):
-                points_per_minute = 2.5
-            elif channel_name.startswith("Roam"):
-                points_per_minute = 1.0
-            else:
-                points_per_minute = 1.0
-
-            points_earned = int(minutes_spent * points_per_minute)
-            await add_points(user_id, points_earned)
-            await update_user_activity(user_id)
-
-            print(
-                f"[VOCALELO] {member.display_name} earned {points_earned} points in {channel.name}"
-            )
-
-
-class CommandPanelView(discord.ui.View):
-
-    def __init__(self):
-        super().__init__(timeout=None)
-        self.add_item(
-            discord.ui.Button(
-                label="Management List",
-                emoji="🧾",
-                style=discord.ButtonStyle.link,
-                url=
-                "https://www.notion.so/1c413420e86080729416d9235414b4ae?v=1c413420e86081bca2e9000c20993c79&pvs=4"
-            ))  # Replace with actual URL
-        self.add_item(
-            discord.ui.Button(
-                label="Reapers Council",
-                emoji="🛡️",
-                style=discord.ButtonStyle.link,
-                url=
-                "https://discord.com/channels/YOUR_GUILD_ID/1355332092418068560"
-            ))
-        self.add_item(
-            discord.ui.Button(
-                label="Direction Logs",
-                emoji="📊",
-                style=discord.ButtonStyle.link,
-                url=
-                "https://discord.com/channels/YOUR_GUILD_ID/1355332142825210229"
-            ))
-
-    @discord.ui.button(label="📖 Info Panel",
-                       style=discord.ButtonStyle.secondary,
-                       custom_id="command_info")
-    async def show_info(self, interaction: discord.Interaction,
-                        button: discord.ui.Button):
-        embed_info = discord.Embed(
-            title=":tools: Officer Command Panel – How It Works",
-            description=
-            "Welcome to the core of our guild’s operations.\nIf you're reading this, you’ve earned our trust.\nHere’s how to use the tools available to guide the guild efficiently.",
-            color=discord.Color.dark_gray())
-        embed_info.add_field(name=":gear: PANEL OVERVIEW",
-                             value="\u200b",
-                             inline=False)
-        embed_info.add_field(
-            name=":link: Player Management List",
-            value=
-            "> Opens our internal Notion tracker. Every member is manually listed.\n- Track member status (:green_circle: active / :red_circle: inactive)\n- Note timezones for ops planning\n- Monitor warnings (:warning: max 3)\n- Flag or promote based on trust, behavior & contribution\n\n➡ Add new recruits as soon as they’re accepted\n➡ Update when someone disappears or excels",
-            inline=False)
-        embed_info.add_field(
-            name=":busts_in_silhouette: Reapers Council",
-            value=
-            "> Officer-only channel. For votes, discussions, and inner-circle coordination.\n- Handle promotions / removals\n- Share critical updates\n- Plan internal strategy\n- Keep it respectful, strategic & efficient",
-            inline=False)
-        embed_info.add_field(
-            name=":scroll: Direction Logs",
-            value=
-            "> Guild-wide strategic vision.\n\n- Long-term goals\n- PvP strategy outlines\n- Positioning in wars / alliances / territory / economy\n- Macro decisions that guide the guild’s direction\n\n**You’re free to lead your squad your way.\nBut everything must align with this vision.**",
-            inline=False)
-        embed_info.add_field(
-            name=":information_source: Information",
-            value=
-            "> Hub for templates, resources, and useful tools.\n\n- Links (Notion, Google Forms, Discord utilities)\n- Templates for welcoming, promotions, etc.\n- Shared officer materials",
-            inline=False)
-        embed_info.add_field(
-            name=":compass: YOUR ROLE AS AN OFFICER",
-            value=
-            "You are **not** a boss.\nYou are a **coordinator**, a **guardian**, a **Reaper**.\n\n- Lead your squad how you want just stay aligned.\n- Promote through action, not ego.\n- Build trust, not noise.\n- We don’t carry the guild. We hold the line. Together.\n\n:checkered_flag: **Your mission:**\n- Spot future Cloaked members\n- Sharpen the unit\n- Support the grind\n- Remove the dead weight\n- Zero drama. Maximum loyalty.\n\n**Silent. Loyal. Lethal.**",
-            inline=False)
-        await interaction.response.send_message(embed=embed_info,
-                                                ephemeral=True)
-
-
-@bot.command()
-@commands.has_permissions(administrator=True)
-async def commandpanel(ctx):
-    embed = discord.Embed(title="**Command Panel**",
-                          description="Choose your path",
-                          color=discord.Color.dark_gold())
-    embed.add_field(name="\n | Player Management List",
-                    value="View and manage players in the guild.",
-                    inline=False)
-    embed.add_field(name="\n | Reapers Council",
-                    value="Access council decisions and notes.",
-                    inline=False)
-    embed.add_field(name="\n | Direction Logs",
-                    value="See logs of leadership actions.",
-                    inline=False)
-    embed.add_field(
-        name="\n | Information",
-        value="All internal documents, standards and announcements.",
-        inline=False)
-    embed.set_image(
-        url="https://cdn.discordapp.com/attachments/CHANNEL_ID/IMAGE_ID.png"
-    )  # Replace this URL
-    await ctx.send(embed=embed, view=CommandPanelView())
-
-
-class WelcomePanelView1(discord.ui.View):
-
-    def __init__(self):
-        super().__init__(timeout=None)
-
-    async def send(self, ctx):
-        embed = discord.Embed(color=0x393A41)
-        embed.set_image(url="https://i.ibb.co/kGWvdgq/text1.png")
-        await ctx.send(embed=embed, view=self)
-
-
-class WelcomePanelView2(discord.ui.View):
-
-    def __init__(self):
-        super().__init__(timeout=None)
-
-    async def send(self, ctx):
-        embed = discord.Embed(
-            description=
-            "### Diplomacy\nView all active Allies, Contracts\n or report in as an Emmisary.‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ",
-            color=0x393A41)
-        embed.set_thumbnail(url="https://i.ibb.co/gMZVhg8T/alliances.png")
-        await ctx.send(embed=embed, view=self)
-
-
-class WelcomePanelView3(discord.ui.View):
-
-    def __init__(self):
-        super().__init__(timeout=None)
-
-    async def send(self, ctx):
-        embed = discord.Embed(
-            description=
-            "### **About us**\nAn overview of the Dune Reapers:\nour values, goals, and inner structure.‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎  ‎ ‎  ‎ ‎",
-            color=0x393A41)
-        embed.set_thumbnail(url="https://i.ibb.co/8D3fKfYs/information.png")
-        await ctx.send(embed=embed, view=self)
-
-
-class ApplicationModal(discord.ui.Modal, title="Dune Reapers Application"):
-
-    def __init__(self):
-        super().__init__()
-        self.steam = discord.ui.TextInput(
-            label="Steam Profile URL",
-            placeholder="Please provide a direct link to your Steam profile.",
-            style=discord.TextStyle.paragraph)
-        self.WhyDR = discord.ui.TextInput(
-            label="Why Dune Reapers?",
-            placeholder=
-            "What interests you about joining Dune Reapers? Tell us what drew you to our guild.",
-            style=discord.TextStyle.paragraph)
-        self.Availability = discord.ui.TextInput(
-            label="Availability & Timezone:",
-            placeholder=
-            "What days and hours are you typically available to play? Please also include your timezone.",
-            style=discord.TextStyle.paragraph)
-        self.Background = discord.ui.TextInput(
-            label="Gaming Background:",
-            placeholder=
-            "Top games played (with hours)? Any competitive, tournaments or clan experience?",
-            style=discord.TextStyle.paragraph)
-        self.Else = discord.ui.TextInput(
-            label="Anything Else?",
-            placeholder="Anything you'd like to add? (Optional)",
-            required=False,
-            style=discord.TextStyle.paragraph)
-
-        self.add_item(self.steam)
-        self.add_item(self.WhyDR)
-        self.add_item(self.Availability)
-        self.add_item(self.Background)
-        self.add_item(self.Else)
-
-    async def on_submit(self, interaction: discord.Interaction):
-        guild = interaction.guild
-        category = guild.get_channel(1360256145918263407)
-
-        if category is None:
-            await interaction.response.send_message(
-                "❌ Error: The application category channel was not found. Please contact an administrator.",
-                ephemeral=True)
-            return
 
-        # Check existing application
-        for channel in category.text_channels:
-            if channel.name == f"application-{interaction.user.name.lower()}":
-                await interaction.response.send_message(
-                    "⚠️ You already have an open application.", ephemeral=True)
-                return
-
-        overwrites = {
-            guild.default_role:
-            discord.PermissionOverwrite(view_channel=False),
-            interaction.user:
-            discord.PermissionOverwrite(view_channel=True, send_messages=True),
-        }
-        admin_role = discord.utils.get(guild.roles, name="Admin")
-        if admin_role:
-            overwrites[admin_role] = discord.PermissionOverwrite(
-                view_channel=True, send_messages=True)
-
-        channel = await guild.create_text_channel(
-            name=f"application︱{interaction.user.name.lower()}",
-            overwrites=overwrites,
-            category=category)
-
-        # Send first image
-        await channel.send(
-            content="https://i.ibb.co/jv7bZPH4/nog-meer-naar-l.png")
-
-        # Send second image inside an embed
-        image_embed = discord.Embed(color=0x393A41)
-        image_embed.set_image(
-            url="https://i.ibb.co/Z1tBKjDb/application-received17.png")
-        await channel.send(embed=image_embed)
-
-        description = (
-            f" ## {interaction.user.mention.upper()}\n ## WISHES TO JOIN OUR RANKS!\n\n"
-            f"1. **Steam Profile URL:**\n   > Answer: {self.steam.value}\n\n"
-            f"2. **Why Dune Reapers?:**\n   > Answer: {self.WhyDR.value}\n\n"
-            f"3. **Availability & Timezone:**\n   > Answer: {self.Availability.value}\n\n"
-            f"4. **Gaming Background:**\n   > Answer: {self.Background.value}\n\n"
-            f"5. **Anything Else?:**\n   > Answer: {self.Else.value or 'N/A'}\n\n"
-            f" ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎‎  ‎ ‎ ‎ ‎‎ ‎ ‎ ‎‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎‎ ‎  ‎ ‎ ‎ ‎")
-
-        embed = discord.Embed(description=description, color=0x393A41)
-        await channel.send(embed=embed)
-        await interaction.response.send_message(
-            f"✅ Application created: {channel.mention}", ephemeral=True)
-
-
-class WelcomePanelView4(discord.ui.View):
-
-    def __init__(self):
-        super().__init__(timeout=None)
-
-    async def send(self, ctx):
-        embed = discord.Embed(
-            description=
-            "### Apply to Join\nFill the form. This is **mandatory** to join.‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎ ‎",
-            color=0x393A41)
-        embed.set_thumbnail(url="https://i.ibb.co/XkdmcVjV/apllymetscroll.png")
-        await ctx.send(embed=embed, view=self)
-
-    @discord.ui.button(label="Diplomacy",
-                       style=discord.ButtonStyle.secondary,
-                       row=0,
-                       custom_id="alliances")
-    async def show_alliances(self, interaction: discord.Interaction,
-                             button: discord.ui.Button):
-        await interaction.response.send_message(
-            "Check <#1361059575654252647> for Diplomacy details.",
-            ephemeral=True)
-
-    @discord.ui.button(label="About us",
-                       style=discord.ButtonStyle.secondary,
-                       row=0,
-                       custom_id="who_we_are")
-    async def show_who_we_are(self, interaction: discord.Interaction,
-                              button: discord.ui.Button):
-        await interaction.response.send_message(
-            "Read about us in <#1354238210485518407>.", ephemeral=True)
-
-    @discord.ui.button(label="Apply to Join",
-                       style=discord.ButtonStyle.success,
-                       row=0,
-                       custom_id="apply_button")
-    async def apply_to_join(self, interaction: discord.Interaction,
-                            button: discord.ui.Button):
-        await interaction.response.send_modal(ApplicationModal())
-
-
-class AbsenceModal(discord.ui.Modal, title="Absence Request"):
-    start_date = discord.ui.TextInput(label="Start Date (DD-MM-YYYY)",
-                                      placeholder="09-04-2025")
-    end_date = discord.ui.TextInput(label="End Date (DD-MM-YYYY)",
-                                    placeholder="16-04-2025")
-    reason = discord.ui.TextInput(label="Reason",
-                                  placeholder="Note or justification...",
-                                  style=discord.TextStyle.paragraph)
-
-    async def on_submit(self, interaction: discord.Interaction):
-        try:
-            break_start = datetime.strptime(self.start_date.value, '%d-%m-%Y')
-            break_end = datetime.strptime(self.end_date.value, '%d-%m-%Y')
-        except ValueError:
-            await interaction.response.send_message(
-                "Invalid format. Use DD-MM-YYYY.", ephemeral=True)
+class ReapersBot(commands.AutoShardedBot):
+    """The bot core: gateway connections, shared state and metrics.
+
+    Features live in the extensions under ``cogs/``. They reach the caches,
+    the activity buffer and the open voice sessions through the bot, so
+    ``!reload`` swaps their code without losing any of that state. Per-guild
+    state only ever covers the guilds of this process's shards; jobs over
+    the whole database run in the :attr:`primary` process.
+    """
+
+    EXTENSIONS = ('cogs.scoring', 'cogs.panels', 'cogs.tickets',
+                  'cogs.absence', 'cogs.admin', 'cogs.roster',
+                  'cogs.backups', 'cogs.ranks')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.db = Database(os.getenv('ELO_DATABASE', 'elo_database.db'))
+        self.activity_buffer = ActivityBuffer(self.db)
+        self.leaderboard = Leaderboard(self.db)
+        self.ticket_index = TicketIndex(self.db)
+        self.guild_settings = GuildSettings(self.db)
+        self.snapshots = Snapshots(self.db, BACKUP_DIR, BACKUP_KEEP)
+        self.transcripts = TranscriptArchive(self.db, TRANSCRIPT_DIR)
+        self.user_resolver = UserResolver(self)
+        self.scoring_gate = ScoringGate(SCORING_PER_MINUTE / 60,
+                                        SCORING_BURST,
+                                        allow=id_set('SCORING_ALLOW_IDS'),
+                                        deny=id_set('SCORING_DENY_IDS'))
+        # Role names the bot gates on, resolved to IDs once per guild
+        self.role_index = RoleIndex("Shade", "Admin")
+        # Track voice sessions; the scoring cog installs the channel rates
+        self.voice_tracker = VoiceTracker(self.db)
+        self.metrics_runner = None
+        self.loop_lag_task = None
+        self.started = time.perf_counter()
+        self.startup_seconds = None
+
+    @property
+    def primary(self) -> bool:
+        """Whether this process runs shard 0, and with it the global
+        jobs."""
+        return self.shard_ids is None or 0 in self.shard_ids
+
+    def gateway_latency(self) -> float:
+        # nan/inf until the first heartbeat is acknowledged
+        return self.latency if 0 <= self.latency < float('inf') else 0.0
+
+    # Check if member has the "Shade" role
+    def is_shaded(self, member: discord.Member) -> bool:
+        return self.role_index.has_role(member, "Shade")
+
+    async def setup_hook(self):
+        # Runs once per process, before the gateway connects. Reconnects
+        # only fire on_ready, so nothing below is repeated.
+        await self.db.connect()
+        await self.claim_legacy_rows()
+        await self.guild_settings.load()
+        await self.ticket_index.load()
+
+        # Extensions register their persistent views and start their
+        # background tasks in cog_load
+        for extension in self.EXTENSIONS:
+            await self.load_extension(extension)
+
+        self.loop_lag_task = asyncio.create_task(sample_loop_lag())
+        if METRICS_PORT:
+            try:
+                self.metrics_runner = await serve('127.0.0.1', METRICS_PORT)
+            except OSError as e:
+                print(f"Metrics endpoint failed to start: {e}")
+
+        # Application commands are global, one process registers them
+        if self.primary:
+            await self.sync_commands()
+
+    async def claim_legacy_rows(self):
+        # Data from before guilds were tracked belongs to HOME_GUILD_ID, or
+        # when that is unset to the only guild the bot is in. setup_hook
+        # runs after login, so the guild list can be fetched over HTTP.
+        if HOME_GUILD_ID:
+            guild_id = HOME_GUILD_ID
+        elif await self.db.has_legacy_rows():
+            guilds = [guild async for guild in self.fetch_guilds(limit=2)]
+            if len(guilds) != 1:
+                # Starting anyway would score the owning guild under its
+                # own ID, next to the rows it should have claimed
+                raise RuntimeError(
+                    "The database holds data from before guilds were "
+                    "tracked and the bot is not in exactly one guild. Set "
+                    "HOME_GUILD_ID to the guild that data belongs to.")
+            guild_id = guilds[0].id
+        else:
             return
-
-        if break_start >= break_end:
-            await interaction.response.send_message(
-                "Start date must be before end date.", ephemeral=True)
+        claimed = await self.db.claim_legacy_rows(guild_id, LEGACY_SETTINGS)
+        if claimed:
+            print(f"[DB] Moved {claimed} rows to guild {guild_id}")
+
+    async def sync_commands(self):
+        # Global sync is rate limited, so only sync when the command
+        # definitions differ from the ones synced last time
+        definitions = [
+            command.to_dict(self.tree)
+            for command in self.tree.get_commands()
+        ]
+        payload = json.dumps(definitions, sort_keys=True)
+        fingerprint = hashlib.sha256(payload.encode()).hexdigest()
+        if await self.db.get_meta('command_fingerprint') == fingerprint:
+            print("Slash commands unchanged, skipping sync")
             return
-
-        async with aiosqlite.connect('elo_database.db') as db:
-            await db.execute(
-                '''
-                INSERT INTO users (user_id, on_break, break_start, break_end)
-                VALUES (?, 1, ?, ?)
-                ON CONFLICT(user_id) DO UPDATE SET on_break = 1, break_start = ?, break_end = ?
-            ''', (str(interaction.user.id), break_start, break_end,
-                  break_start, break_end))
-            await db.commit()
-
-        await interaction.response.send_message(
-            "Your absence request has been submitted. An admin will assign the `Shade` role.",
-            ephemeral=True)
-
-        channel = bot.get_channel(ABSENCE_REQUEST_CHANNEL_ID)
-        if channel:
-            embed = discord.Embed(
-                title="👻 New Absence Request",
-                description=f"**From:** {interaction.user.mention}",
-                color=discord.Color.dark_purple())
-            embed.add_field(name="Reason",
-                            value=self.reason.value,
-                            inline=False)
-            embed.add_field(
-                name="Period",
-                value=
-                f"From **{self.start_date.value}** to **{self.end_date.value}**",
-                inline=False)
-            await channel.send(embed=embed)
-
-
-class CloseTicketView(discord.ui.View):
-
-    def __init__(self):
-        super().__init__(timeout=None)
-
-    @discord.ui.button(label="❌ Close Ticket",
-                       style=discord.ButtonStyle.danger)
-    async def close(self, interaction: discord.Interaction,
-                    button: discord.ui.Button):
-        await interaction.channel.delete()
-
-
-@bot.tree.command(name="away", description="Request an absence period")
-async def away_slash_command(interaction: discord.Interaction):
-    await interaction.response.send_modal(AbsenceModal())
-
-
-...
-
-
-class AbsencePanelView1(discord.ui.View):
-
-    def __init__(self):
-        super().__init__(timeout=None)
-
-    async def send(self, ctx):
-        embed = discord.Embed(color=0x393A41)
-        embed.set_image(url="https://i.ibb.co/kGWvdgq/text1.png")
-        await ctx.send(embed=embed, view=self)
-
-
-class AbsencePanelView2(discord.ui.View):
-
-    def __init__(self):
-        super().__init__(timeout=None)
-
-    async def send(self, ctx):
-        embed = discord.Embed(
-            description=
-            "### 📡 Operation Protocol\nGuild behavior, coordination expectations, and absence justification.",
-            color=0x393A41)
-        embed.set_image(url="https://i.ibb.co/jZV2G2M/text2.png")
-        await ctx.send(embed=embed, view=self)
-
-
-class AbsencePanelView3(discord.ui.View):
-
-    def __init__(self):
-        super().__init__(timeout=None)
-
-    async def send(self, ctx):
-        embed = discord.Embed(
-            description=
-            "### 🎫 Ticket Support\nFor important topics only. Suggestion, content creation, or guild help.",
-            color=0x393A41)
-        embed.set_image(url="https://i.ibb.co/BV6nvnm/text3.png")
-        await ctx.send(embed=embed, view=self)
-
-
-# Panel Part 1
-@bot.command()
-@commands.has_permissions(administrator=True)
-async def AbsencePanelView1(ctx):
-    await ctx.send("https://i.ibb.co/PZ3qCqyt/text8.png")
-
-
-# Panel Part 2
-@bot.command()
-@commands.has_permissions(administrator=True)
-async def AbsencePanelView2(ctx):
-    embed = discord.Embed(
-        title="🛡️ Dune Reapers - Absence Panel",
-        description="Guidance for managing your activity within the guild.",
-        color=0x393A41)
-    embed.add_field(
-        name="Why Submit Absence?",
-        value="Avoid automatic ELO decay and maintain your standing.",
-        inline=False)
-    embed.add_field(
-        name="When to Submit",
-        value="If you're inactive for more than 48h. Use the form below.",
-        inline=False)
-    embed.set_footer(text="Discipline is what sets Reapers apart.")
-    await ctx.send(embed=embed)
-
-
-# Panel Part 3
-@bot.command()
-@commands.has_permissions(administrator=True)
-async def AbsencePanelView3(ctx):
-    embed = discord.Embed(
-        title="📡 Operation Protocol",
-        description=
-        "A Reaper follows structure. Here’s how we act during guild missions.",
-        color=0x393A41)
-    embed.add_field(
-        name="Join Voice",
-        value=
-        "Operations are voice-led. Join the designated voice channel and be ready.",
-        inline=False)
-    embed.add_field(
-        name="Follow Orders",
-        value="Leaders give short and clear commands. Execute without delay.",
-        inline=False)
-    embed.add_field(
-        name="Comms Discipline",
-        value="No chatter during fights. Prioritize clarity and awareness.",
-        inline=False)
-    embed.set_footer(text="Efficiency wins wars.")
-    await ctx.send(embed=embed)
-
-
-# Panel Part 4
-@bot.command()
-@commands.has_permissions(administrator=True)
-async def AbsencePanelView4(ctx):
-    view = ReapersPanelView()
-    await view.send(ctx)
-
-
-# Reapers Control Panel with all interactions
-class ReapersPanelView(discord.ui.View):
-
-    def __init__(self):
-        super().__init__(timeout=None)
-
-    async def send(self, ctx):
-        embed = discord.Embed(title="🛡️ Dune Reapers - Activity Panel",
-                              description="Choose your action below:",
-                              color=0x393A41)
-        embed.add_field(
-            name="📡 Operation Protocol",
-            value="View behavior rules and voice etiquette during operations.",
-            inline=False)
-        embed.add_field(
-            name="🎫 Open Ticket",
-            value="Ask for help, propose improvements or suggestions.",
-            inline=False)
-        embed.add_field(
-            name="📆 Submit Absence",
-            value=
-            "Declare an absence with reason and dates. Shade role will be assigned manually.",
-            inline=False)
-        embed.set_footer(text="Stay sharp. Reapers are built, not born.")
-        embed.set_image(
-            url="https://cdn.discordapp.com/attachments/CHANNEL_ID/IMAGE_ID.png"
-        )  # Replace with your image URL
-        await ctx.send(embed=embed, view=self)
-
-    @discord.ui.button(label="📡 Operation Protocol",
-                       style=discord.ButtonStyle.secondary,
-                       custom_id="ops_protocol")
-    async def show_ops_info(self, interaction: discord.Interaction,
-                            button: discord.ui.Button):
-        await absencepanel3(interaction)
-
-    @discord.ui.button(label="🎫 Open Ticket",
-                       style=discord.ButtonStyle.secondary,
-                       custom_id="open_ticket")
-    async def open_ticket(self, interaction: discord.Interaction,
-                          button: discord.ui.Button):
-        guild = interaction.guild
-        category = guild.get_channel(TICKET_CATEGORY_ID)
-
-        for channel in category.text_channels:
-            if channel.name == f"ticket-{interaction.user.name.lower()}":
-                await interaction.response.send_message(
-                    "You already have an open ticket! Please close it before opening a new one.",
-                    ephemeral=True)
-                return
-
-        overwrites = {
-            guild.default_role:
-            discord.PermissionOverwrite(read_messages=False),
-            interaction.user:
-            discord.PermissionOverwrite(read_messages=True, send_messages=True)
-        }
-
-        ticket_channel = await guild.create_text_channel(
-            name=f"ticket-{interaction.user.name}",
-            overwrites=overwrites,
-            category=category)
-
-        await ticket_channel.send(view=CloseTicketView())
-
-        embed = discord.Embed(
-            title="📬 New Ticket Opened",
-            description=
-            f"**Welcome {interaction.user.mention}** <@&{ADMIN_ROLE_ID}>",
-            color=discord.Color.dark_teal())
-        embed.add_field(
-            name="We handle",
-            value=
-            "- 💡 Suggestions & improvements\n- 📎 Sharing tools or strategies\n- 🎥 Content or recruitment ideas\n- 🧠 Anything smart that improves the guild",
-            inline=False)
-        embed.add_field(
-            name="Reminder",
-            value=
-            "Respect the time of the team. Don’t open tickets for random questions or complaints, bring value.\n\n**Reapers don’t whine. They bring solutions.**",
-            inline=False)
-        await ticket_channel.send(embed=embed)
-        await interaction.response.send_message(
-            f"Your ticket has been created: {ticket_channel.mention}",
-            ephemeral=True)
-
-    @discord.ui.button(label="📆 Submit Absence",
-                       style=discord.ButtonStyle.danger,
-                       custom_id="submit_absence")
-    async def open_modal(self, interaction: discord.Interaction,
-                         button: discord.ui.Button):
-        await interaction.response.send_modal(AbsenceModal())
-
-
-@bot.command(name='back')
-async def end_absence(ctx):
-    async with aiosqlite.connect('elo_database.db') as db:
-        await db.execute(
-            '''
-            UPDATE users SET on_break = 0, break_start = NULL, break_end = NULL WHERE user_id = ?
-        ''', (str(ctx.author.id), ))
-        await db.commit()
-    await ctx.send('Welcome back among us Reaper!.')
-
-
-@tasks.loop(hours=24)
-async def check_inactivity():
-    now = datetime.utcnow()
-    async with aiosqlite.connect('elo_database.db') as db:
-        async with db.execute(
-                'SELECT user_id, elo, last_active, on_break FROM users'
-        ) as cursor:
-            async for user_id, elo, last_active, on_break in cursor:
-                if on_break:
-                    continue
-                if last_active:
-                    days_inactive = (now -
-                                     datetime.fromisoformat(last_active)).days
-                    if days_inactive > 2:
-                        loss = int(100 * (1.5**(days_inactive - 1)))
-                        new_elo = max(0, elo - loss)
-                        await db.execute(
-                            'UPDATE users SET elo = ?, last_active = ? WHERE user_id = ?',
-                            (new_elo, now, user_id))
-        await db.commit()
-
-
-@bot.command(name='elo')
-@commands.has_permissions(administrator=True)
-async def check_elo(ctx):
-    user_id = str(ctx.author.id)
-    async with aiosqlite.connect('elo_database.db') as db:
-        async with db.execute('SELECT elo FROM users WHERE user_id = ?',
-                              (user_id, )) as cursor:
-            row = await cursor.fetchone()
-            if row:
-                await ctx.send(
-                    f"🏆 {ctx.author.mention}, your current ELO is **{row[0]}**."
-                )
-            else:
-                await ctx.send(
-                    "You don't have an ELO yet. Start chatting or joining voice channels!"
-                )
-
-
-@bot.command(name="onbreak")
-@commands.has_permissions(administrator=True)
-async def show_on_break(ctx):
-    async with aiosqlite.connect('elo_database.db') as db:
-        async with db.execute(
-                'SELECT user_id, break_start, break_end FROM users WHERE on_break = 1'
-        ) as cursor:
-            rows = await cursor.fetchall()
-    if not rows:
-        await ctx.send("No members are currently on break.")
-    else:
-        msg = "**Members that are currently on break:**\n"
-        for user_id, start, end in rows:
-            user = await bot.fetch_user(int(user_id))
-            msg += f"• {user.name} – from {start} to {end}\n"
-        await ctx.send(msg)
-
-
-@bot.command()
-@commands.has_permissions(administrator=True)
-async def welcomepanel1(ctx):
-    await ctx.send("https://i.ibb.co/PZ3qCqyt/text8.png")
-
-
-@bot.command()
-@commands.has_permissions(administrator=True)
-async def welcomepanel2(ctx):
-    view = WelcomePanelView2()
-    await view.send(ctx)
-
-
-@bot.command()
-@commands.has_permissions(administrator=True)
-async def welcomepanel3(ctx):
-    view = WelcomePanelView3()
-    await view.send(ctx)
-
-
-@bot.command()
-@commands.has_permissions(administrator=True)
-async def welcomepanel4(ctx):
-    view = WelcomePanelView4()
-    await view.send(ctx)
-
-
-@bot.command()
-@commands.has_permissions(administrator=True)
-async def absencepanel1(ctx):
-    await ctx.send("https://i.ibb.co/PZ3qCqyt/text8.png")
-
-
-@bot.command()
-@commands.has_permissions(administrator=True)
-async def absencepanel2(ctx):
-    view = AbsencePanelView2()
-    await view.send(ctx)
-
-
-@bot.command()
-@commands.has_permissions(administrator=True)
-async def absencepanel3(ctx):
-    view = AbsencePanelView3()
-    await view.send(ctx)
-
-
-@bot.command()
-@commands.has_permissions(administrator=True)
-async def absencepanel4(ctx):
-    view = AbsencePanelView4()
-    await view.send(ctx)
-
-
-@bot.command()
-@commands.has_permissions(administrator=True)
-async def showimage(ctx):
-    await ctx.send("https://i.ibb.co/jv7bZPH4/nog-meer-naar-l.png")
-
-
-@bot.command()
-@commands.has_permissions(administrator=True)
-async def showimage1(ctx):
-    await ctx.send(
-        "https://images-ext-1.discordapp.net/external/1gdXDIMiErw6HdSphvEAt7XZMknPUWg8A9uIQzFgcvU/https/i.ibb.co/GQ6nM8dv/Vector-118.png?format=webp&quality=lossless&width=1860&height=325"
-    )
-
-
-bot.run(TOKEN)
+        try:
+            synced = await self.tree.sync()
+            await self.db.set_meta('command_fingerprint', fingerprint)
+            print(f"Synced {len(synced)} slash commands")
+        except Exception as e:
+            print(f"Slash command sync failed: {e}")
+
+    async def _run_event(self, coro, event_name, *args, **kwargs):
+        # Every event listener is dispatched through here
+        started = time.perf_counter()
+        try:
+            await super()._run_event(coro, event_name, *args, **kwargs)
+        finally:
+            REGISTRY.observe_handler('event', event_name,
+                                     time.perf_counter() - started)
+
+    async def close(self):
+        # Stop the extensions' background tasks, then settle open voice
+        # sessions and buffered writes before the connection goes away
+        for extension in tuple(self.extensions):
+            await self.unload_extension(extension)
+        if self.loop_lag_task is not None:
+            self.loop_lag_task.cancel()
+        if self.metrics_runner is not None:
+            await self.metrics_runner.cleanup()
+        # Channels being archived are deleted once their transcript is
+        # saved, which still needs the connection
+        await self.transcripts.wait_closed()
+        await self.voice_tracker.settle_all(datetime.utcnow())
+        await self.activity_buffer.flush()
+        await self.db.close()
+        await super().close()
+
+    def cached_members(self) -> int:
+        return sum(len(guild.members) for guild in self.guilds)
+
+    async def on_ready(self):
+        print(f"{self.user} is now online.")
+        if self.startup_seconds is None:
+            self.startup_seconds = time.perf_counter() - self.started
+            print(f"[STARTUP] Ready in {self.startup_seconds:.2f}s · "
+                  f"RSS {rss_bytes() / 2**20:.1f} MiB · "
+                  f"{self.cached_members()} members cached in "
+                  f"{len(self.guilds)} guilds on {len(self.shards)} of "
+                  f"{self.shard_count} shards")
+
+    async def on_guild_available(self, guild):
+        self.role_index.rebuild(guild)
+        # Extensions that need the role index listen for this instead
+        self.dispatch('guild_ready', guild)
+
+    async def on_guild_join(self, guild):
+        self.role_index.rebuild(guild)
+
+    async def on_guild_remove(self, guild):
+        self.role_index.forget_guild(guild)
+
+    async def on_member_update(self, before, after):
+        if before.roles != after.roles:
+            self.role_index.update_member(after)
+
+    async def on_member_remove(self, member):
+        self.role_index.remove_member(member)
+
+    async def on_guild_role_create(self, role):
+        if self.role_index.tracks(role):
+            self.role_index.rebuild(role.guild)
+
+    async def on_guild_role_update(self, before, after):
+        if before.name != after.name and (self.role_index.tracks(before)
+                                          or self.role_index.tracks(after)):
+            self.role_index.rebuild(after.guild)
+
+    async def on_guild_role_delete(self, role):
+        if self.role_index.tracks(role):
+            self.role_index.rebuild(role.guild)
+
+    async def on_app_command_completion(self, interaction, command):
+        observe_app_command(interaction, command)
+
+
+# Create bot instance. In low-memory mode members are cached as they show
+# up in events and filled on demand (see members.ensure_members); nothing
+# reads the message cache, so it is disabled.
+bot = ReapersBot(command_prefix='!',
+                 intents=intents,
+                 tree_cls=TimedCommandTree,
+                 chunk_guilds_at_startup=not LOW_MEMORY,
+                 max_messages=None if LOW_MEMORY else 1000,
+                 shard_count=SHARD_COUNT,
+                 shard_ids=SHARD_IDS)
+
+
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.started = time.perf_counter()
+
+
+@bot.after_invoke
+async def stop_command_timer(ctx):
+    REGISTRY.observe_handler('command', ctx.command.qualified_name,
+                             time.perf_counter() - ctx.started,
+                             ctx.command_failed)
+
+
+REGISTRY.gauge('reapers_gateway_latency_seconds', "Gateway heartbeat latency.",
+               bot.gateway_latency)
+REGISTRY.gauge('reapers_activity_pending_rows', "Buffered activity rows.",
+               lambda: bot.activity_buffer.pending_rows)
+REGISTRY.gauge('reapers_activity_flushed_rows', "Activity rows flushed.",
+               lambda: bot.activity_buffer.flushed_rows)
+REGISTRY.gauge('reapers_voice_sessions_open', "Open voice sessions.",
+               lambda: len(bot.voice_tracker.sessions))
+REGISTRY.gauge('reapers_db_commits', "Write transactions committed.",
+               lambda: bot.db.commits)
+REGISTRY.gauge('reapers_scoring_accepted', "Messages that earned points.",
+               lambda: bot.scoring_gate.accepted)
+REGISTRY.gauge('reapers_scoring_throttled', "Messages over the rate limit.",
+               lambda: bot.scoring_gate.throttled)
+REGISTRY.gauge('reapers_scoring_denied', "Messages in unscored channels.",
+               lambda: bot.scoring_gate.denied)
+REGISTRY.gauge('reapers_process_rss_bytes', "Resident memory.", rss_bytes)
+REGISTRY.gauge('reapers_members_cached', "Members in the member cache.",
+               bot.cached_members)
+REGISTRY.gauge('reapers_startup_seconds', "Process start to first ready.",
+               lambda: bot.startup_seconds or 0.0)
+
+if __name__ == "__main__":
+    bot.run(TOKEN)
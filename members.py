@@ -0,0 +1,87 @@
+import asyncio
+import time
+from typing import Iterable
+
+import discord
+
+
+# User IDs per gateway member request, the API maximum
+QUERY_BATCH = 100
+
+
+async def ensure_members(guild: discord.Guild,
+                         user_ids: Iterable[int]) -> dict[int, discord.Member]:
+    """Members of ``guild`` by ID, filling the cache for those missing.
+
+    Guilds are not chunked at startup, so the member cache only holds
+    members seen in events. Misses are requested over the gateway in
+    batches and cached. IDs that are not members of the guild, or that the
+    gateway did not answer for in time, are left out.
+    """
+    members = {}
+    missing = []
+    for user_id in user_ids:
+        member = guild.get_member(user_id)
+        if member is not None:
+            members[user_id] = member
+        else:
+            missing.append(user_id)
+    for start in range(0, len(missing), QUERY_BATCH):
+        try:
+            found = await guild.query_members(
+                user_ids=missing[start:start + QUERY_BATCH],
+                limit=QUERY_BATCH,
+                cache=True)
+        except asyncio.TimeoutError:
+            continue
+        members.update((member.id, member) for member in found)
+    return members
+
+
+class UserResolver:
+    """Resolves user IDs to display names, cheapest source first.
+
+    The guild member cache is tried first, then a gateway member request
+    that also fills the cache. Users who are no longer members are fetched
+    over REST concurrently, bounded by a semaphore, and remembered for
+    ``ttl`` seconds so repeated commands don't spend rate limit on the same
+    users.
+    """
+
+    def __init__(self,
+                 client: discord.Client,
+                 concurrency: int = 5,
+                 ttl: float = 300):
+        self.client = client
+        self.ttl = ttl
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._cache: dict[int, tuple[str, float]] = {}
+
+    async def _fetch(self, user_id: int) -> str:
+        cached = self._cache.get(user_id)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+        async with self._semaphore:
+            try:
+                name = (await self.client.fetch_user(user_id)).name
+            except discord.NotFound:
+                name = f"Unknown user {user_id}"
+        now = time.monotonic()
+        if len(self._cache) >= 1024:
+            self._cache = {
+                key: entry
+                for key, entry in self._cache.items() if entry[1] > now
+            }
+        self._cache[user_id] = (name, now + self.ttl)
+        return name
+
+    async def names(self, guild: discord.Guild,
+                    user_ids: Iterable[int]) -> dict[int, str]:
+        user_ids = list(user_ids)
+        members = await ensure_members(guild, user_ids) if guild else {}
+        names = {user_id: member.name for user_id, member in members.items()}
+        missing = [user_id for user_id in user_ids if user_id not in names]
+        fetched = await asyncio.gather(*(self._fetch(user_id)
+                                         for user_id in missing))
+        names.update(zip(missing, fetched))
+        return names
@@ -0,0 +1,248 @@
+"""In-process latency histograms and counters.
+
+Everything records into the module-level ``REGISTRY``. main.py feeds it from
+the event dispatcher, command hooks, the app command tree and the UI base
+classes below; database.py records every statement. The data is read back by
+the ``!stats`` command and served in Prometheus text format on localhost.
+"""
+import asyncio
+import functools
+import math
+import os
+import sys
+import time
+from typing import Callable
+
+import discord
+from aiohttp import web
+from discord import app_commands
+
+# Upper bounds in seconds, Prometheus style
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+           5.0, math.inf)
+
+
+class Histogram:
+    __slots__ = ('counts', 'count', 'sum')
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        for index, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, fraction: float) -> float:
+        """Bucket upper bound holding the given quantile (an estimate)."""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                bound = BUCKETS[index]
+                return bound if bound != math.inf else BUCKETS[-2]
+        return BUCKETS[-2]
+
+
+class Metrics:
+
+    def __init__(self):
+        # (kind, name) -> Histogram, kind is event/command/app_command/ui
+        self.handlers: dict[tuple[str, str], Histogram] = {}
+        self.errors: dict[tuple[str, str], int] = {}
+        self.sql: dict[str, Histogram] = {}
+        self.sql_rows: dict[str, int] = {}
+        self.loop_lag = Histogram()
+        self.gauges: dict[str, tuple[str, Callable[[], float]]] = {}
+
+    def observe_handler(self,
+                        kind: str,
+                        name: str,
+                        seconds: float,
+                        failed: bool = False) -> None:
+        key = (kind, name)
+        histogram = self.handlers.get(key)
+        if histogram is None:
+            histogram = self.handlers[key] = Histogram()
+        histogram.observe(seconds)
+        if failed:
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+    def observe_sql(self, statement: str, seconds: float, rows: int) -> None:
+        histogram = self.sql.get(statement)
+        if histogram is None:
+            histogram = self.sql[statement] = Histogram()
+        histogram.observe(seconds)
+        self.sql_rows[statement] = self.sql_rows.get(statement, 0) + rows
+
+    def gauge(self, name: str, help_text: str,
+              read: Callable[[], float]) -> None:
+        self.gauges[name] = (help_text, read)
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        lines = []
+
+        def histogram(metric, labels, data):
+            cumulative = 0
+            for bound, count in zip(BUCKETS, data.counts):
+                cumulative += count
+                le = '+Inf' if bound == math.inf else repr(bound)
+                lines.append(f'{metric}_bucket{{{labels}le="{le}"}} '
+                             f'{cumulative}')
+            lines.append(f'{metric}_sum{{{labels.rstrip(",")}}} {data.sum}')
+            lines.append(
+                f'{metric}_count{{{labels.rstrip(",")}}} {data.count}')
+
+        lines.append('# HELP reapers_handler_seconds Handler latency.')
+        lines.append('# TYPE reapers_handler_seconds histogram')
+        for (kind, name), data in sorted(self.handlers.items()):
+            histogram('reapers_handler_seconds',
+                      f'kind="{kind}",name="{name}",', data)
+
+        lines.append('# HELP reapers_handler_errors_total Failed handlers.')
+        lines.append('# TYPE reapers_handler_errors_total counter')
+        for (kind, name), count in sorted(self.errors.items()):
+            lines.append(f'reapers_handler_errors_total{{kind="{kind}",'
+                         f'name="{name}"}} {count}')
+
+        lines.append('# HELP reapers_sql_seconds SQL statement latency.')
+        lines.append('# TYPE reapers_sql_seconds histogram')
+        for statement, data in sorted(self.sql.items()):
+            histogram('reapers_sql_seconds', f'statement="{statement}",',
+                      data)
+
+        lines.append('# HELP reapers_sql_rows_total Rows read or written.')
+        lines.append('# TYPE reapers_sql_rows_total counter')
+        for statement, rows in sorted(self.sql_rows.items()):
+            lines.append(
+                f'reapers_sql_rows_total{{statement="{statement}"}} {rows}')
+
+        lines.append('# HELP reapers_event_loop_lag_seconds Scheduling lag.')
+        lines.append('# TYPE reapers_event_loop_lag_seconds histogram')
+        histogram('reapers_event_loop_lag_seconds', '', self.loop_lag)
+
+        for name, (help_text, read) in sorted(self.gauges.items()):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {read()}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Metrics()
+
+
+def timed(kind: str, name: str, callback):
+    """Wrap a coroutine function so each call is recorded in REGISTRY."""
+
+    @functools.wraps(callback)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = await callback(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            REGISTRY.observe_handler(kind, name,
+                                     time.perf_counter() - started, failed)
+
+    return wrapper
+
+
+class TimedView(discord.ui.View):
+    """View whose component callbacks are recorded as ``ui`` handlers."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for item in self.children:
+            callback = getattr(item, 'callback', None)
+            function = getattr(callback, 'callback', callback)
+            if getattr(item, 'url', None) is None and callback is not None:
+                item.callback = timed(
+                    'ui', f"{type(self).__name__}.{function.__name__}",
+                    callback)
+
+
+class TimedModal(discord.ui.Modal):
+    """Modal whose submit handler is recorded as a ``ui`` handler."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_submit = timed('ui', f"{type(self).__name__}.on_submit",
+                               self.on_submit)
+
+
+class TimedCommandTree(app_commands.CommandTree):
+    """Command tree that times slash commands from check to completion."""
+
+    async def interaction_check(self,
+                                interaction: discord.Interaction) -> bool:
+        interaction.extras['started'] = time.perf_counter()
+        return True
+
+    async def on_error(self, interaction: discord.Interaction,
+                       error: app_commands.AppCommandError) -> None:
+        started = interaction.extras.get('started')
+        if started is not None and interaction.command is not None:
+            REGISTRY.observe_handler('app_command',
+                                     interaction.command.qualified_name,
+                                     time.perf_counter() - started, True)
+        await super().on_error(interaction, error)
+
+
+def observe_app_command(interaction: discord.Interaction, command) -> None:
+    started = interaction.extras.get('started')
+    if started is not None:
+        REGISTRY.observe_handler('app_command', command.qualified_name,
+                                 time.perf_counter() - started)
+
+
+def rss_bytes() -> int:
+    """Resident set size of this process, or its peak where the current
+    value is not available."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+async def sample_loop_lag(interval: float = 0.5) -> None:
+    """Record how late the event loop wakes a sleeping task, forever."""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        REGISTRY.loop_lag.observe(max(0.0, loop.time() - expected))
+
+
+async def serve(host: str, port: int) -> web.AppRunner:
+    """Serve REGISTRY at http://host:port/metrics."""
+
+    async def handle(request):
+        return web.Response(text=REGISTRY.render(),
+                            content_type='text/plain',
+                            charset='utf-8')
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,275 @@
+"""Schema migrations, applied in order at startup.
+
+The schema version lives in ``PRAGMA user_version``. Each migration runs in
+its own transaction together with the version bump, so a failed migration
+leaves the database at the previous version and the next start retries it.
+Processes started together apply each migration once.
+Append new migrations to the end of ``MIGRATIONS``; never edit one that has
+shipped.
+"""
+import aiosqlite
+
+
+def _epoch(column: str) -> str:
+    # Text timestamps written by sqlite3's default datetime adapter
+    return f"CAST(strftime('%s', {column}) AS INTEGER)"
+
+
+MIGRATIONS = [
+    # 1: tables as they were created before versioning existed
+    ('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id TEXT PRIMARY KEY,
+            elo INTEGER DEFAULT 1000,
+            last_active TIMESTAMP,
+            on_break INTEGER DEFAULT 0,
+            break_start TIMESTAMP,
+            break_end TIMESTAMP
+        )
+    ''', '''
+        CREATE TABLE IF NOT EXISTS voice_sessions (
+            user_id TEXT PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            started_at TIMESTAMP NOT NULL,
+            last_seen TIMESTAMP NOT NULL,
+            units_credited INTEGER DEFAULT 0
+        )
+    ''', '''
+        CREATE TABLE IF NOT EXISTS tickets (
+            channel_id INTEGER PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            user_id TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL,
+            UNIQUE (user_id, kind)
+        )
+    '''),
+    # 2: integer epoch-second timestamps and secondary indexes
+    ('''
+        CREATE TABLE users_new (
+            user_id TEXT PRIMARY KEY,
+            elo INTEGER NOT NULL DEFAULT 1000,
+            last_active INTEGER,
+            on_break INTEGER NOT NULL DEFAULT 0,
+            break_start INTEGER,
+            break_end INTEGER
+        )
+    ''', f'''
+        INSERT INTO users_new
+        SELECT user_id, COALESCE(elo, 1000), {_epoch('last_active')},
+               COALESCE(on_break, 0), {_epoch('break_start')},
+               {_epoch('break_end')}
+        FROM users
+    ''', 'DROP TABLE users', 'ALTER TABLE users_new RENAME TO users', '''
+        CREATE TABLE voice_sessions_new (
+            user_id TEXT PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            started_at INTEGER NOT NULL,
+            last_seen INTEGER NOT NULL,
+            units_credited INTEGER NOT NULL DEFAULT 0
+        )
+    ''', f'''
+        INSERT INTO voice_sessions_new
+        SELECT user_id, guild_id, channel_id, {_epoch('started_at')},
+               {_epoch('last_seen')}, units_credited
+        FROM voice_sessions
+    ''', 'DROP TABLE voice_sessions',
+     'ALTER TABLE voice_sessions_new RENAME TO voice_sessions', '''
+        CREATE TABLE tickets_new (
+            channel_id INTEGER PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            user_id TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            created_at INTEGER NOT NULL,
+            UNIQUE (user_id, kind)
+        )
+    ''', f'''
+        INSERT INTO tickets_new
+        SELECT channel_id, guild_id, user_id, kind, {_epoch('created_at')}
+        FROM tickets
+    ''', 'DROP TABLE tickets', 'ALTER TABLE tickets_new RENAME TO tickets',
+     'CREATE INDEX idx_users_break_active ON users (on_break, last_active)',
+     'CREATE INDEX idx_users_last_active ON users (last_active)',
+     'CREATE INDEX idx_users_elo ON users (elo)'),
+    # 3: small key/value store for bot bookkeeping
+    ('''
+        CREATE TABLE meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    ''', ),
+    # 4: milli-point ELO, the points ledger and its daily rollup
+    ('''
+        CREATE TABLE users_new (
+            user_id TEXT PRIMARY KEY,
+            elo_milli INTEGER NOT NULL DEFAULT 1000000,
+            elo INTEGER GENERATED ALWAYS AS (elo_milli / 1000) VIRTUAL,
+            last_active INTEGER,
+            on_break INTEGER NOT NULL DEFAULT 0,
+            break_start INTEGER,
+            break_end INTEGER
+        )
+    ''', '''
+        INSERT INTO users_new (user_id, elo_milli, last_active, on_break,
+                               break_start, break_end)
+        SELECT user_id, elo * 1000, last_active, on_break, break_start,
+               break_end
+        FROM users
+    ''', 'DROP TABLE users', 'ALTER TABLE users_new RENAME TO users',
+     'CREATE INDEX idx_users_break_active ON users (on_break, last_active)',
+     'CREATE INDEX idx_users_last_active ON users (last_active)',
+     'CREATE INDEX idx_users_elo ON users (elo_milli)', '''
+        CREATE TABLE points_ledger (
+            id INTEGER PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            at INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            amount INTEGER NOT NULL
+        )
+    ''', '''
+        CREATE TABLE points_daily (
+            user_id TEXT NOT NULL,
+            day INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            events INTEGER NOT NULL,
+            PRIMARY KEY (user_id, day, kind)
+        ) WITHOUT ROWID
+    '''),
+    # 5: per-guild settings, and scoring data keyed by guild. Rows from
+    # before guilds were tracked get guild 0 until they are claimed.
+    ('''
+        CREATE TABLE guild_settings (
+            guild_id INTEGER NOT NULL,
+            key TEXT NOT NULL,
+            value INTEGER NOT NULL,
+            PRIMARY KEY (guild_id, key)
+        ) WITHOUT ROWID
+    ''', '''
+        CREATE TABLE users_new (
+            guild_id INTEGER NOT NULL,
+            user_id TEXT NOT NULL,
+            elo_milli INTEGER NOT NULL DEFAULT 1000000,
+            elo INTEGER GENERATED ALWAYS AS (elo_milli / 1000) VIRTUAL,
+            last_active INTEGER,
+            on_break INTEGER NOT NULL DEFAULT 0,
+            break_start INTEGER,
+            break_end INTEGER,
+            PRIMARY KEY (guild_id, user_id)
+        )
+    ''', '''
+        INSERT INTO users_new (guild_id, user_id, elo_milli, last_active,
+                               on_break, break_start, break_end)
+        SELECT 0, user_id, elo_milli, last_active, on_break, break_start,
+               break_end
+        FROM users
+    ''', 'DROP TABLE users', 'ALTER TABLE users_new RENAME TO users',
+     '''CREATE INDEX idx_users_break_active
+        ON users (guild_id, on_break, last_active)''',
+     'CREATE INDEX idx_users_last_active ON users (last_active)',
+     'CREATE INDEX idx_users_elo ON users (guild_id, elo_milli)', '''
+        CREATE TABLE voice_sessions_new (
+            guild_id INTEGER NOT NULL,
+            user_id TEXT NOT NULL,
+            channel_id INTEGER NOT NULL,
+            started_at INTEGER NOT NULL,
+            last_seen INTEGER NOT NULL,
+            units_credited INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (guild_id, user_id)
+        )
+    ''', '''
+        INSERT INTO voice_sessions_new
+        SELECT guild_id, user_id, channel_id, started_at, last_seen,
+               units_credited
+        FROM voice_sessions
+    ''', 'DROP TABLE voice_sessions',
+     'ALTER TABLE voice_sessions_new RENAME TO voice_sessions', '''
+        CREATE TABLE tickets_new (
+            channel_id INTEGER PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            user_id TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            created_at INTEGER NOT NULL,
+            UNIQUE (guild_id, user_id, kind)
+        )
+    ''', '''
+        INSERT INTO tickets_new
+        SELECT channel_id, guild_id, user_id, kind, created_at FROM tickets
+    ''', 'DROP TABLE tickets', 'ALTER TABLE tickets_new RENAME TO tickets',
+     '''ALTER TABLE points_ledger
+        ADD COLUMN guild_id INTEGER NOT NULL DEFAULT 0''',
+     '''
+        CREATE TABLE points_daily_new (
+            guild_id INTEGER NOT NULL,
+            user_id TEXT NOT NULL,
+            day INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            events INTEGER NOT NULL,
+            PRIMARY KEY (guild_id, user_id, day, kind)
+        ) WITHOUT ROWID
+    ''', '''
+        INSERT INTO points_daily_new
+        SELECT 0, user_id, day, kind, amount, events FROM points_daily
+    ''', 'DROP TABLE points_daily',
+     'ALTER TABLE points_daily_new RENAME TO points_daily'),
+    # 6: transcripts of closed tickets and applications. The owner is
+    # unknown for channels that were never indexed.
+    ('''
+        CREATE TABLE transcripts (
+            id INTEGER PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            channel_name TEXT NOT NULL,
+            user_id TEXT,
+            kind TEXT NOT NULL,
+            closed_at INTEGER NOT NULL,
+            messages INTEGER NOT NULL,
+            path TEXT NOT NULL
+        )
+    ''', '''
+        CREATE INDEX idx_transcripts_owner
+        ON transcripts (guild_id, user_id, kind, closed_at)
+    '''),
+    # 7: the rank role last given to each member, which stands in for the
+    # roles of members outside the cache
+    ('''
+        CREATE TABLE rank_roles (
+            guild_id INTEGER NOT NULL,
+            user_id TEXT NOT NULL,
+            role_id INTEGER NOT NULL,
+            PRIMARY KEY (guild_id, user_id)
+        ) WITHOUT ROWID
+    ''', ),
+]
+
+
+async def migrate(conn: aiosqlite.Connection) -> int:
+    """Bring the database up to the latest version and return it."""
+    async with conn.execute('PRAGMA user_version') as cursor:
+        (version, ) = await cursor.fetchone()
+
+    for target, statements in enumerate(MIGRATIONS, start=1):
+        if target <= version:
+            continue
+        # Shard processes share the file: take the write lock first, then
+        # check whether another process applied this one meanwhile
+        await conn.execute('BEGIN IMMEDIATE')
+        try:
+            async with conn.execute('PRAGMA user_version') as cursor:
+                (version, ) = await cursor.fetchone()
+            if target <= version:
+                await conn.commit()
+                continue
+            for statement in statements:
+                await conn.execute(statement)
+            await conn.execute(f'PRAGMA user_version = {target}')
+        except BaseException:
+            await conn.rollback()
+            raise
+        await conn.commit()
+        print(f"[DB] Migrated schema to version {target}")
+        version = target
+    return version
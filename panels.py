@@ -0,0 +1,193 @@
+"""Panels defined as data in panels.json.
+
+``embeds`` holds embeds in Discord's JSON form, keyed by name. ``panels``
+combine optional message content, embeds by name and buttons. A button is
+either a link (``url``) or has a ``custom_id`` and one action: ``reply``
+(ephemeral text), ``reply_embed`` (ephemeral embed by name) or ``handler``
+(``"Cog.method"``, called with the interaction). ``commands`` maps a
+prefix command name to the panel it posts; commands are admin-only unless
+listed in ``public_commands``.
+
+``reply`` text and link ``url`` values may use ``{guild_id}`` and the
+settings in ``guilds.SETTINGS`` as format fields, filled in per guild. A
+link whose settings are missing for the guild is left off the panel.
+
+Everything is validated and every embed is built once when the file is
+loaded; sends reuse the same objects.
+"""
+import json
+import string
+from pathlib import Path
+from typing import Optional
+
+import discord
+
+from guilds import SETTINGS
+from metrics import TimedView, timed
+
+PANELS_PATH = Path(__file__).with_name('panels.json')
+
+BUTTON_ACTIONS = ('reply', 'reply_embed', 'handler')
+
+FORMAT_FIELDS = frozenset({'guild_id', *SETTINGS})
+
+
+class PanelView(TimedView):
+    """Buttons of one panel. Every non-link button has a ``custom_id``, so
+    the view is registered as persistent and survives restarts. Links are
+    only added when ``values`` are given to fill in their URL."""
+
+    def __init__(self, panel: 'Panel', values: Optional[dict] = None):
+        super().__init__(timeout=None)
+        for spec in panel.buttons:
+            url = spec.get('url')
+            if url is not None:
+                try:
+                    url = url.format_map(values)
+                except (KeyError, TypeError):
+                    continue
+            button = discord.ui.Button(label=spec['label'],
+                                       emoji=spec.get('emoji'),
+                                       style=spec['style'],
+                                       url=url,
+                                       custom_id=spec.get('custom_id'),
+                                       row=spec.get('row'))
+            if button.url is None:
+                button.callback = timed(
+                    'ui', f"{panel.name}.{button.custom_id}",
+                    _action(spec, panel.registry))
+            self.add_item(button)
+
+
+def _action(spec: dict, registry: 'PanelRegistry'):
+    if 'reply' in spec:
+        text = spec['reply']
+
+        async def reply(interaction: discord.Interaction):
+            try:
+                content = text.format_map(
+                    interaction.client.guild_settings.values(
+                        interaction.guild_id))
+            except KeyError:
+                content = "This isn't set up on this server yet."
+            await interaction.response.send_message(content, ephemeral=True)
+
+        return reply
+    if 'reply_embed' in spec:
+        embed = registry.embeds[spec['reply_embed']]
+
+        async def reply_embed(interaction: discord.Interaction):
+            await interaction.response.send_message(embed=embed,
+                                                    ephemeral=True)
+
+        return reply_embed
+
+    cog_name, method = spec['handler'].split('.')
+
+    async def handler(interaction: discord.Interaction):
+        # Looked up per click so the handler follows extension reloads
+        cog = interaction.client.get_cog(cog_name)
+        if cog is None:
+            await interaction.response.send_message(
+                "This feature is unavailable right now, try again shortly.",
+                ephemeral=True)
+            return
+        await getattr(cog, method)(interaction)
+
+    return handler
+
+
+class Panel:
+    __slots__ = ('name', 'registry', 'content', 'embeds', 'buttons')
+
+    def __init__(self, name: str, registry: 'PanelRegistry',
+                 content: Optional[str], embeds: list[discord.Embed],
+                 buttons: list[dict]):
+        self.name = name
+        self.registry = registry
+        self.content = content
+        self.embeds = embeds
+        self.buttons = buttons
+
+    def view(self, values: Optional[dict] = None) -> Optional[PanelView]:
+        return PanelView(self, values) if self.buttons else None
+
+    async def send(self,
+                   destination: discord.abc.Messageable,
+                   values: Optional[dict] = None) -> None:
+        kwargs = {'content': self.content, 'embeds': self.embeds}
+        view = self.view(values)
+        if view is not None:
+            kwargs['view'] = view
+        await destination.send(**kwargs)
+
+
+class PanelRegistry:
+
+    def __init__(self, config: dict):
+        self.embeds = {
+            name: discord.Embed.from_dict(data)
+            for name, data in config.get('embeds', {}).items()
+        }
+        self.panels = {
+            name: self._panel(name, data)
+            for name, data in config.get('panels', {}).items()
+        }
+        self.commands = dict(config.get('commands', {}))
+        self.public_commands = frozenset(config.get('public_commands', ()))
+        for command, panel in self.commands.items():
+            if panel not in self.panels:
+                raise ValueError(
+                    f"Command {command!r} posts unknown panel {panel!r}")
+
+    @classmethod
+    def load(cls, path: Path = PANELS_PATH) -> 'PanelRegistry':
+        with open(path, encoding='utf-8') as file:
+            return cls(json.load(file))
+
+    def _panel(self, name: str, data: dict) -> Panel:
+        embeds = []
+        for embed in data.get('embeds', ()):
+            if embed not in self.embeds:
+                raise ValueError(
+                    f"Panel {name!r} uses unknown embed {embed!r}")
+            embeds.append(self.embeds[embed])
+        buttons = []
+        for spec in data.get('buttons', ()):
+            spec = dict(spec)
+            try:
+                spec['style'] = discord.ButtonStyle[spec.get('style',
+                                                             'secondary')]
+            except KeyError:
+                raise ValueError(f"Panel {name!r} has a button with unknown "
+                                 f"style {spec['style']!r}") from None
+            actions = [key for key in BUTTON_ACTIONS if key in spec]
+            if 'url' not in spec and (len(actions) != 1
+                                      or 'custom_id' not in spec):
+                raise ValueError(
+                    f"Panel {name!r} button {spec.get('label')!r} needs a "
+                    f"url, or a custom_id and one of {BUTTON_ACTIONS}")
+            if spec.get('reply_embed', '') not in ('', *self.embeds):
+                raise ValueError(f"Panel {name!r} replies with unknown "
+                                 f"embed {spec['reply_embed']!r}")
+            if spec.get('handler', '.').count('.') != 1:
+                raise ValueError(f"Panel {name!r} handler "
+                                 f"{spec['handler']!r} is not 'Cog.method'")
+            for key in ('reply', 'url'):
+                fields = {
+                    field
+                    for _, field, _, _ in string.Formatter().parse(
+                        spec.get(key, '')) if field is not None
+                }
+                if not fields <= FORMAT_FIELDS:
+                    raise ValueError(
+                        f"Panel {name!r} button {spec.get('label')!r} uses "
+                        f"unknown fields {sorted(fields - FORMAT_FIELDS)}")
+            buttons.append(spec)
+        return Panel(name, self, data.get('content'), embeds, buttons)
+
+    def persistent_views(self) -> list[PanelView]:
+        return [
+            PanelView(panel) for panel in self.panels.values()
+            if any('custom_id' in spec for spec in panel.buttons)
+        ]
@@ -0,0 +1,240 @@
+"""ELO rank tiers from ranks.json, shown as roles.
+
+``tiers`` pair a role name with the ``min_elo`` it takes. A member holds
+the role of the highest tier they reach and no other rank role; members
+without an ELO hold none. Roles are looked up by name in each guild, so
+one file serves every server, and tiers whose role a server lacks, or that
+sits above the bot's own role, are left out there.
+"""
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+import discord
+
+from database import Database, to_milli
+
+RANKS_PATH = Path(__file__).with_name('ranks.json')
+
+# Role edits per run, and the spacing between two of them. Member role
+# edits share a per-guild rate limit with everything else the bot does to
+# members, so runs stay well under it.
+RUN_BUDGET = 200
+EDIT_INTERVAL = 1.0
+# An edit that took longer than this waited out a rate limit; the run stops
+# there and the next one carries on
+SLOW_EDIT = 5.0
+
+REASON = "ELO rank"
+
+
+class RankTiers:
+
+    def __init__(self, config: dict):
+        tiers = []
+        for index, data in enumerate(config.get('tiers', ())):
+            try:
+                tiers.append((to_milli(float(data['min_elo'])),
+                              str(data['role'])))
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(
+                    f"Rank tier {index} is invalid: {e}") from None
+        names = [name for _, name in tiers]
+        if len(set(names)) != len(names):
+            raise ValueError("Every rank tier needs a role of its own")
+        # Highest first, so the first tier reached is the one held
+        self.tiers = sorted(tiers, reverse=True)
+
+    @classmethod
+    def load(cls, path: Path = RANKS_PATH) -> 'RankTiers':
+        with open(path, encoding='utf-8') as file:
+            return cls(json.load(file))
+
+    def roles(self, guild: discord.Guild) -> list[tuple[int, discord.Role]]:
+        """``(min_elo_milli, role)`` for the tiers the bot can give in
+        ``guild``, highest first."""
+        roles = []
+        for min_elo, name in self.tiers:
+            role = discord.utils.get(guild.roles, name=name)
+            if role is not None and role.is_assignable():
+                roles.append((min_elo, role))
+        return roles
+
+
+class RankChange:
+    """The rank role ``want`` a member should hold, and the edits that get
+    them there from the roles they hold now."""
+
+    __slots__ = ('user_id', 'want', 'add', 'remove')
+
+    def __init__(self, user_id: int, want: Optional[discord.Role],
+                 have: list[discord.Role]):
+        self.user_id = user_id
+        self.want = want
+        self.add = want is not None and want not in have
+        self.remove = [role for role in have if role != want]
+
+    @property
+    def edits(self) -> int:
+        return self.add + len(self.remove)
+
+
+class RankReconciler:
+    """Brings members' rank roles in line with their ELO.
+
+    Each run diffs the tier every member should hold against the rank
+    roles they hold and edits only the difference. Cached members are
+    compared by their actual roles; members outside the cache by the role
+    last recorded for them in ``rank_roles``, so the member list never has
+    to be fetched. Edits are spaced ``EDIT_INTERVAL`` apart and a run
+    makes at most ``budget`` of them. A guild's changes are worked through
+    in user ID order from a cursor kept in ``meta``, so a run cut short by
+    the budget, a rate limit or a restart is picked up where it stopped.
+    """
+
+    def __init__(self,
+                 client: discord.Client,
+                 db: Database,
+                 budget: int = RUN_BUDGET,
+                 interval: float = EDIT_INTERVAL):
+        self.client = client
+        self.db = db
+        self.budget = budget
+        self.interval = interval
+        self._lock = asyncio.Lock()
+        self._next_edit = 0.0
+        self._last_guild = 0
+
+    async def diff(self, guild: discord.Guild,
+                   tiers: RankTiers) -> list[RankChange]:
+        """Every member whose rank role, or recorded rank role, is not the
+        one their ELO earns, in user ID order."""
+        roles = tiers.roles(guild)
+        by_id = {role.id: role for _, role in roles}
+        if not by_id:
+            return []
+
+        changes = {}
+        rated = set()
+        for user_id, elo_milli, recorded in await self.db.rank_state(
+                guild.id):
+            user_id = int(user_id)
+            rated.add(user_id)
+            want = next(
+                (role for min_elo, role in roles if elo_milli >= min_elo),
+                None)
+            member = guild.get_member(user_id)
+            if member is None:
+                have = [by_id[recorded]] if recorded in by_id else []
+            elif member.bot:
+                continue
+            else:
+                have = [role for role in member.roles if role.id in by_id]
+            change = RankChange(user_id, want, have)
+            # A record that no longer matches is corrected without an edit
+            if change.edits or recorded != (want.id if want else None):
+                changes[user_id] = change
+
+        # Cached holders without an ELO lose their rank roles
+        for _, role in roles:
+            for member in role.members:
+                if member.id not in rated and not member.bot:
+                    changes[member.id] = RankChange(
+                        member.id, None,
+                        [role for role in member.roles if role.id in by_id])
+        return [changes[user_id] for user_id in sorted(changes)]
+
+    async def _edit(self, guild_id: int, user_id: int, role: discord.Role,
+                    add: bool) -> float:
+        """Add or remove one role and return how long the request took."""
+        delay = self._next_edit - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        started = time.monotonic()
+        try:
+            # By ID, so members outside the cache need no fetch
+            if add:
+                await self.client.http.add_role(guild_id, user_id, role.id,
+                                                reason=REASON)
+            else:
+                await self.client.http.remove_role(guild_id,
+                                                   user_id,
+                                                   role.id,
+                                                   reason=REASON)
+        finally:
+            self._next_edit = time.monotonic() + self.interval
+        return time.monotonic() - started
+
+    async def reconcile(self, guild: discord.Guild, tiers: RankTiers,
+                        budget: int) -> tuple[int, int]:
+        """Apply up to ``budget`` role edits of the guild's diff. Returns
+        the edits made and the number of members still to update."""
+        changes = await self.diff(guild, tiers)
+        cursor_key = f'rank_roles:{guild.id}'
+        cursor = resumed = int(await self.db.get_meta(cursor_key) or 0)
+        # Resume after the last member handled, then wrap around
+        start = next((index for index, change in enumerate(changes)
+                      if change.user_id > cursor), 0)
+        changes = changes[start:] + changes[:start]
+
+        made = 0
+        handled = 0
+        recorded = []
+        try:
+            for change in changes:
+                if made + change.edits > budget:
+                    break
+                edits = [(change.want, True)] if change.add else []
+                edits += [(role, False) for role in change.remove]
+                slow = False
+                try:
+                    for role, add in edits:
+                        slow = await self._edit(guild.id, change.user_id,
+                                                role, add) > SLOW_EDIT
+                        made += 1
+                except discord.NotFound:
+                    # Left the guild; the record keeps them from being
+                    # retried until they are seen again
+                    pass
+                except discord.Forbidden as e:
+                    print(f"[RANKS] Cannot edit roles in {guild.name}: {e}")
+                    break
+                recorded.append((str(change.user_id),
+                                 change.want.id if change.want else None))
+                cursor = change.user_id
+                handled += 1
+                if slow:
+                    break
+        finally:
+            if recorded:
+                await self.db.set_rank_roles(guild.id, recorded)
+            if handled == len(changes):
+                cursor = 0
+            if cursor != resumed:
+                await self.db.set_meta(cursor_key, str(cursor))
+        left = sum(1 for change in changes[handled:] if change.edits)
+        return made, left
+
+    async def run(self, guilds: Iterable[discord.Guild],
+                  tiers: RankTiers) -> tuple[int, int]:
+        """Reconcile ``guilds`` within one run's budget, starting after the
+        guild the last run ended in. Returns the edits made and the members
+        still to update in the guilds reached."""
+        async with self._lock:
+            guilds = sorted(guilds, key=lambda guild: guild.id)
+            start = next((index for index, guild in enumerate(guilds)
+                          if guild.id > self._last_guild), 0)
+            budget = self.budget
+            made = left = 0
+            for guild in guilds[start:] + guilds[:start]:
+                if budget <= 0:
+                    break
+                guild_made, guild_left = await self.reconcile(
+                    guild, tiers, budget)
+                made += guild_made
+                left += guild_left
+                budget -= guild_made
+                self._last_guild = guild.id
+            return made, left
@@ -0,0 +1,127 @@
+"""Voice points-per-unit rates defined as data in rates.json.
+
+``rules`` are tried in order and the first match gives the channel's rate;
+channels nothing matches earn ``default``. A rule matches on any of
+``channel_ids``, ``category_ids`` or ``name``, a regular expression searched
+case-insensitively in the channel name. A rule's ``schedule`` lists
+windows, in UTC, whose ``multiplier`` applies on top of its ``rate``::
+
+    {"days": ["sat", "sun"], "start": "19:00", "end": "23:00",
+     "multiplier": 2}
+
+``days`` is optional, and a window whose ``end`` is before its ``start``
+runs past midnight into the next day.
+
+The file is validated and compiled once when loaded. Each channel is
+matched the first time it is scored and its rate kept by ID, so scoring a
+session is one dict lookup; :meth:`RateTable.forget` drops a channel that
+was renamed or moved.
+"""
+import json
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+
+import discord
+
+RATES_PATH = Path(__file__).with_name('rates.json')
+
+DAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+
+def _minutes(value: str) -> int:
+    hours, minutes = value.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+class Window:
+    __slots__ = ('days', 'start', 'end', 'multiplier')
+
+    def __init__(self, data: dict):
+        self.days = frozenset(
+            DAYS.index(day.lower()[:3]) for day in data.get('days', DAYS))
+        self.start = _minutes(data['start'])
+        self.end = _minutes(data['end'])
+        self.multiplier = float(data['multiplier'])
+
+    def active(self, now: datetime) -> bool:
+        minute = now.hour * 60 + now.minute
+        if self.start <= self.end:
+            return (now.weekday() in self.days
+                    and self.start <= minute < self.end)
+        # Past midnight the window belongs to the day it started on
+        if minute >= self.start:
+            return now.weekday() in self.days
+        return minute < self.end and (now.weekday() - 1) % 7 in self.days
+
+
+class RateRule:
+    __slots__ = ('channel_ids', 'category_ids', 'pattern', 'rate', 'schedule')
+
+    def __init__(self, data: dict):
+        self.channel_ids = frozenset(data.get('channel_ids', ()))
+        self.category_ids = frozenset(data.get('category_ids', ()))
+        self.pattern = re.compile(data['name'],
+                                  re.IGNORECASE) if 'name' in data else None
+        self.rate = float(data['rate'])
+        self.schedule = [Window(window) for window in data.get('schedule', ())]
+
+    def matches(self, channel: discord.abc.GuildChannel) -> bool:
+        return (channel.id in self.channel_ids
+                or getattr(channel, 'category_id', None) in self.category_ids
+                or self.pattern is not None
+                and self.pattern.search(channel.name) is not None)
+
+    def rate_at(self, now: datetime) -> float:
+        for window in self.schedule:
+            if window.active(now):
+                return self.rate * window.multiplier
+        return self.rate
+
+
+class RateTable:
+
+    def __init__(self, config: dict):
+        self.default = float(config.get('default', 1.0))
+        self.rules = []
+        for index, data in enumerate(config.get('rules', ())):
+            if not {'channel_ids', 'category_ids', 'name'} & data.keys():
+                raise ValueError(f"Rate rule {index} matches nothing; give "
+                                 f"channel_ids, category_ids or name")
+            try:
+                self.rules.append(RateRule(data))
+            except (KeyError, ValueError, re.error) as e:
+                raise ValueError(
+                    f"Rate rule {index} is invalid: {e}") from None
+        # channel_id -> rate, or the rule when its rate follows a schedule
+        self._rates: dict[int, object] = {}
+
+    @classmethod
+    def load(cls, path: Path = RATES_PATH) -> 'RateTable':
+        with open(path, encoding='utf-8') as file:
+            return cls(json.load(file))
+
+    def _compile(self, channel: discord.abc.GuildChannel) -> object:
+        for rule in self.rules:
+            if rule.matches(channel):
+                return rule if rule.schedule else rule.rate
+        return self.default
+
+    def rate(self,
+             channel_id: int,
+             resolve: Callable[[int], Optional[discord.abc.GuildChannel]],
+             now: Optional[datetime] = None) -> float:
+        rate = self._rates.get(channel_id)
+        if rate is None:
+            channel = resolve(channel_id)
+            if channel is None:
+                # Not cached yet; match it once the channel is known
+                return self.default
+            rate = self._rates[channel_id] = self._compile(channel)
+        if isinstance(rate, RateRule):
+            return rate.rate_at(now or datetime.utcnow())
+        return rate
+
+    def forget(self, channel_id: int) -> None:
+        self._rates.pop(channel_id, None)
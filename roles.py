@@ -0,0 +1,70 @@
+from typing import Optional
+
+import discord
+
+
+class RoleIndex:
+    """In-memory index of who holds a set of named roles, per guild.
+
+    Role names are resolved to IDs once per guild, so role-gated checks on
+    the hot path never scan ``guild.roles``. Members arriving with an event
+    are checked against their own role IDs, which the gateway always sends,
+    so the check holds even when the member cache is not chunked. The
+    holder sets cover members known only by ID and are filled from the cache
+    at rebuild and from member events. The gateway events wired up in
+    main.py keep the index current.
+    """
+
+    def __init__(self, *names: str):
+        self.names = names
+        self._role_ids: dict[tuple[int, str], int] = {}
+        self._holders: dict[int, set[int]] = {}
+
+    def rebuild(self, guild: discord.Guild) -> None:
+        for name in self.names:
+            old_id = self._role_ids.pop((guild.id, name), None)
+            if old_id is not None:
+                self._holders.pop(old_id, None)
+            role = discord.utils.get(guild.roles, name=name)
+            if role is not None:
+                self._role_ids[(guild.id, name)] = role.id
+                self._holders[role.id] = {member.id for member in role.members}
+
+    def forget_guild(self, guild: discord.Guild) -> None:
+        for name in self.names:
+            role_id = self._role_ids.pop((guild.id, name), None)
+            self._holders.pop(role_id, None)
+
+    def role(self, guild: discord.Guild, name: str) -> Optional[discord.Role]:
+        role_id = self._role_ids.get((guild.id, name))
+        return guild.get_role(role_id) if role_id is not None else None
+
+    def has_role(self, member: discord.abc.User, name: str) -> bool:
+        guild = getattr(member, 'guild', None)
+        if guild is None:
+            return False
+        role_id = self._role_ids.get((guild.id, name))
+        if role_id is None:
+            return False
+        if isinstance(member, discord.Member):
+            return member.get_role(role_id) is not None
+        return member.id in self._holders[role_id]
+
+    def update_member(self, member: discord.Member) -> None:
+        for name in self.names:
+            role_id = self._role_ids.get((member.guild.id, name))
+            if role_id is None:
+                continue
+            if member.get_role(role_id) is not None:
+                self._holders[role_id].add(member.id)
+            else:
+                self._holders[role_id].discard(member.id)
+
+    def remove_member(self, member: discord.Member) -> None:
+        for name in self.names:
+            role_id = self._role_ids.get((member.guild.id, name))
+            if role_id is not None:
+                self._holders[role_id].discard(member.id)
+
+    def tracks(self, role: discord.Role) -> bool:
+        return role.name in self.names or role.id in self._holders
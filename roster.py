@@ -0,0 +1,138 @@
+"""Gzipped CSV and JSONL dumps of a guild's ``users`` rows.
+
+Every row has the columns in ``COLUMNS``. ``elo`` is in points and may
+have decimals; timestamps are UTC in ISO format (``2025-04-09 18:30:00``)
+or empty, and ones with an offset are converted to UTC on import. The same files are read back by :func:`read_rows`, so an export
+can be corrected in a spreadsheet and imported again.
+"""
+import csv
+import gzip
+import io
+import json
+import tempfile
+from datetime import datetime, timedelta, timezone
+from typing import BinaryIO, Iterator, Optional
+
+from database import MILLI, Database, from_epoch, to_epoch, to_milli
+
+FORMATS = ('csv', 'jsonl')
+
+COLUMNS = ('user_id', 'elo', 'last_active', 'on_break', 'break_start',
+           'break_end')
+
+# Exports are built in memory up to this size and spill to a temporary
+# file beyond it
+SPOOL_BYTES = 4 * 2**20
+
+# Rows per upsert batch on import
+IMPORT_BATCH = 500
+
+IMPORT_SUFFIXES = ('.csv', '.jsonl', '.csv.gz', '.jsonl.gz')
+
+# Imported values outside these are rejected. Nothing the bot recorded
+# predates Discord; breaks can be booked ahead, but not by more than a year.
+MAX_ELO = 10**9
+EARLIEST = datetime(2015, 1, 1)
+BREAK_AHEAD = timedelta(days=366)
+
+
+def _timestamp(seconds: Optional[int]) -> str:
+    return from_epoch(seconds).isoformat(sep=' ') if seconds else ''
+
+
+def _epoch(record: dict, column: str, latest: datetime) -> Optional[int]:
+    value = record.get(column)
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    if not EARLIEST <= moment <= latest:
+        raise ValueError(f"{column} {value!r} is not between "
+                         f"{EARLIEST:%Y-%m-%d} and {latest:%Y-%m-%d %H:%M}")
+    return to_epoch(moment)
+
+
+async def export_users(db: Database, guild_id: int, fmt: str) -> BinaryIO:
+    """Write the guild's rows to a gzipped file in ``fmt`` and return it,
+    rewound. Only one fetch batch is in memory at a time."""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+    try:
+        with io.TextIOWrapper(gzip.GzipFile(fileobj=spool, mode='wb'),
+                              encoding='utf-8',
+                              newline='') as text:
+            writer = csv.writer(text)
+            if fmt == 'csv':
+                writer.writerow(COLUMNS)
+            async for rows in db.export_users(guild_id):
+                for (user_id, elo_milli, last_active, on_break, break_start,
+                     break_end) in rows:
+                    values = (user_id, elo_milli / MILLI,
+                              _timestamp(last_active), on_break,
+                              _timestamp(break_start), _timestamp(break_end))
+                    if fmt == 'csv':
+                        writer.writerow(values)
+                    else:
+                        text.write(
+                            json.dumps(dict(zip(COLUMNS, values))) + '\n')
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def _records(data: bytes, filename: str) -> Iterator[dict]:
+    if filename.endswith('.gz'):
+        stream = gzip.GzipFile(fileobj=io.BytesIO(data))
+        filename = filename[:-3]
+    else:
+        stream = io.BytesIO(data)
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if filename.endswith('.jsonl'):
+        for line in text:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        yield from csv.DictReader(text)
+
+
+def _row(record: dict, now: datetime) -> dict:
+    user_id = str(record['user_id']).strip()
+    if not user_id.isdigit():
+        raise ValueError(f"user_id {user_id!r} is not a Discord ID")
+    elo = float(record['elo'])
+    # Also false for nan
+    if not 0 <= elo <= MAX_ELO:
+        raise ValueError(f"elo {record['elo']!r} is not between 0 and "
+                         f"{MAX_ELO}")
+    return {
+        'user_id': user_id,
+        'elo_milli': to_milli(elo),
+        'last_active': _epoch(record, 'last_active', now),
+        'on_break': int(record.get('on_break') or 0),
+        'break_start': _epoch(record, 'break_start', now + BREAK_AHEAD),
+        'break_end': _epoch(record, 'break_end', now + BREAK_AHEAD),
+    }
+
+
+def read_rows(data: bytes, filename: str,
+              now: datetime) -> Iterator[list[dict]]:
+    """Parse a file named with one of ``IMPORT_SUFFIXES`` into batches of
+    rows for :meth:`Database.import_users`. Raises ValueError naming the
+    first row that does not parse or is out of range."""
+    batch = []
+    count = 0
+    try:
+        for record in _records(data, filename):
+            batch.append(_row(record, now))
+            count += 1
+            if len(batch) >= IMPORT_BATCH:
+                yield batch
+                batch = []
+    except KeyError as e:
+        raise ValueError(f"Row {count + 1}: missing column {e}") from None
+    except (TypeError, ValueError, OverflowError, OSError) as e:
+        raise ValueError(f"Row {count + 1}: {e}") from None
+    if batch:
+        yield batch
@@ -0,0 +1,78 @@
+import time
+from typing import Iterable, Optional
+
+import discord
+
+
+class ScoringGate:
+    """Decides which messages earn points, before any database work.
+
+    A channel is skipped when its ID, its parent's or its category's is in
+    ``deny``; when ``allow`` is non-empty only channels matching it score.
+    Each user then draws from a token bucket that refills at ``rate`` tokens
+    per second up to ``burst``, so a spammer earns at most ``rate`` messages
+    worth of points however fast they type.
+    """
+
+    def __init__(self,
+                 rate: float,
+                 burst: float,
+                 allow: Iterable[int] = (),
+                 deny: Iterable[int] = (),
+                 max_users: int = 4096):
+        self.rate = rate
+        self.burst = burst
+        self.allow = frozenset(allow)
+        self.deny = frozenset(deny)
+        self.max_users = max_users
+        self._buckets: dict[int, list[float]] = {}  # user_id -> [tokens, at]
+        self.accepted = 0
+        self.throttled = 0
+        self.denied = 0
+
+    def channel_scores(self, channel: discord.abc.Messageable) -> bool:
+        ids = {
+            getattr(channel, 'id', None),
+            getattr(channel, 'parent_id', None),
+            getattr(channel, 'category_id', None)
+        }
+        if not ids.isdisjoint(self.deny):
+            return False
+        return not self.allow or not ids.isdisjoint(self.allow)
+
+    def _take(self, user_id: int, now: float) -> bool:
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            if len(self._buckets) >= self.max_users:
+                self._prune(now)
+            bucket = self._buckets[user_id] = [self.burst, now]
+        else:
+            bucket[0] = min(self.burst,
+                            bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] < 1:
+            return False
+        bucket[0] -= 1
+        return True
+
+    def _prune(self, now: float) -> None:
+        # A bucket that has refilled is the same as no bucket at all
+        full_after = self.burst / self.rate if self.rate else float('inf')
+        self._buckets = {
+            user_id: bucket
+            for user_id, bucket in self._buckets.items()
+            if now - bucket[1] < full_after
+        }
+
+    def admit(self,
+              user_id: int,
+              channel: discord.abc.Messageable,
+              now: Optional[float] = None) -> bool:
+        if not self.channel_scores(channel):
+            self.denied += 1
+            return False
+        if not self._take(user_id, time.monotonic() if now is None else now):
+            self.throttled += 1
+            return False
+        self.accepted += 1
+        return True
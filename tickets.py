@@ -0,0 +1,85 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+import discord
+
+from database import Database
+
+TICKET = "ticket"
+APPLICATION = "application"
+
+
+class TicketIndex:
+    """Open ticket and application channels, keyed by guild and owner.
+
+    Backed by the ``tickets`` table and kept in sync by the channel
+    create/delete events and the close button. Channel creation goes through
+    :meth:`creating`, a per-user lock, so the duplicate check and the insert
+    cannot interleave between two fast clicks.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+        self._channels: dict[tuple[int, str, int], int] = {}
+        self._owners: dict[int, tuple[str, int, int]] = {}
+        self._locks: dict[int, list] = {}  # user_id -> [lock, users]
+
+    async def load(self) -> None:
+        self._channels.clear()
+        self._owners.clear()
+        for channel_id, guild_id, user_id, kind in await self.db.tickets():
+            self._channels[(guild_id, kind, int(user_id))] = channel_id
+            self._owners[channel_id] = (kind, int(user_id), guild_id)
+
+    def channel_id(self, guild_id: int, kind: str,
+                   user_id: int) -> Optional[int]:
+        return self._channels.get((guild_id, kind, user_id))
+
+    def owner(self, channel_id: int) -> Optional[tuple[str, int, int]]:
+        return self._owners.get(channel_id)
+
+    @asynccontextmanager
+    async def creating(self, user_id: int) -> AsyncIterator[None]:
+        entry = self._locks.setdefault(user_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[user_id]
+
+    async def add(self, channel: discord.abc.GuildChannel, kind: str,
+                  user_id: int) -> None:
+        if self._owners.get(channel.id) == (kind, user_id, channel.guild.id):
+            return
+        self._channels[(channel.guild.id, kind, user_id)] = channel.id
+        self._owners[channel.id] = (kind, user_id, channel.guild.id)
+        await self.db.add_ticket(channel.id, channel.guild.id, user_id, kind,
+                                 datetime.utcnow())
+
+    async def remove(self, channel_id: int) -> None:
+        owner = self._owners.pop(channel_id, None)
+        if owner is None:
+            return
+        kind, user_id, guild_id = owner
+        if self._channels.get((guild_id, kind, user_id)) == channel_id:
+            del self._channels[(guild_id, kind, user_id)]
+        await self.db.remove_tickets([channel_id])
+
+    async def prune(self, guild: discord.Guild) -> None:
+        """Forget channels of ``guild`` that were deleted while offline."""
+        missing = [
+            channel_id
+            for channel_id, (_, _, guild_id) in self._owners.items()
+            if guild_id == guild.id and guild.get_channel(channel_id) is None
+        ]
+        for channel_id in missing:
+            kind, user_id, _ = self._owners.pop(channel_id)
+            if self._channels.get((guild.id, kind, user_id)) == channel_id:
+                del self._channels[(guild.id, kind, user_id)]
+        if missing:
+            await self.db.remove_tickets(missing)
@@ -0,0 +1,180 @@
+"""Transcripts of ticket and application channels, written before the
+channel is deleted.
+
+Each transcript is a pair of gzipped files sharing a base path:
+``<base>.jsonl.gz`` holds one JSON object per message, oldest first, and
+``<base>.html.gz`` renders the same messages as a page that can be read in
+a browser. The base path is recorded in the ``transcripts`` table.
+"""
+import asyncio
+import gzip
+import html
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import discord
+
+from database import Database
+
+SUFFIXES = ('.jsonl.gz', '.html.gz')
+
+PAGE_HEAD = '''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>#{name}</title>
+<style>
+body {{ background: #313338; color: #dbdee1; font: 15px sans-serif;
+       max-width: 900px; margin: auto; padding: 16px; }}
+.message {{ margin: 12px 0; }}
+.author {{ color: #f2f3f5; font-weight: bold; }}
+.time {{ color: #949ba4; font-size: 12px; margin-left: 6px; }}
+.content {{ white-space: pre-wrap; }}
+.embed {{ border-left: 4px solid #4e5058; background: #2b2d31;
+         padding: 8px 12px; margin-top: 4px; white-space: pre-wrap; }}
+a {{ color: #00a8fc; }}
+</style></head><body>
+<h1>#{name}</h1>
+'''
+
+PAGE_FOOT = ('<p class="time">{count} messages · closed {closed}</p>\n'
+             '</body></html>\n')
+
+
+def _record(message: discord.Message) -> dict:
+    return {
+        'id': message.id,
+        'created_at': message.created_at.isoformat(),
+        'author_id': message.author.id,
+        'author': str(message.author),
+        'content': message.content,
+        'embeds': [embed.to_dict() for embed in message.embeds],
+        'attachments': [{
+            'filename': attachment.filename,
+            'url': attachment.url
+        } for attachment in message.attachments],
+    }
+
+
+def _render(record: dict) -> str:
+    parts = [
+        '<div class="message"><span class="author">',
+        html.escape(record['author']), '</span><span class="time">',
+        record['created_at'][:19].replace('T', ' '), '</span>'
+    ]
+    if record['content']:
+        parts += ['<div class="content">',
+                  html.escape(record['content']), '</div>']
+    for embed in record['embeds']:
+        text = [embed.get('title', ''), embed.get('description', '')]
+        for field in embed.get('fields', ()):
+            text.append(f"{field['name']}\n{field['value']}")
+        image = embed.get('image', {}).get('url')
+        parts.append('<div class="embed">')
+        parts.append(html.escape('\n\n'.join(filter(None, text))))
+        if image:
+            parts.append(f'<br><a href="{html.escape(image)}">'
+                         f'{html.escape(image)}</a>')
+        parts.append('</div>')
+    for attachment in record['attachments']:
+        parts.append(f'<div><a href="{html.escape(attachment["url"])}">'
+                     f'📎 {html.escape(attachment["filename"])}</a></div>')
+    parts.append('</div>\n')
+    return ''.join(parts)
+
+
+class TranscriptArchive:
+    """Archives channels under ``directory`` in background tasks.
+
+    :meth:`close` starts an archive and returns straight away; the channel
+    is deleted once its transcript is written and recorded. History is
+    streamed a page at a time into both files, so memory does not grow
+    with the channel. If archiving fails the channel is kept, so nothing
+    is lost.
+    """
+
+    def __init__(self, db: Database, directory: str):
+        self.db = db
+        self.directory = Path(directory)
+        self._tasks: dict[int, asyncio.Task] = {}  # channel_id -> task
+
+    def __contains__(self, channel_id: int) -> bool:
+        return channel_id in self._tasks
+
+    async def write(self, channel: discord.TextChannel, kind: str,
+                    user_id: Optional[int], closed_at: datetime) -> Path:
+        """Write the transcript of ``channel`` and record it. Returns the
+        base path of its files."""
+        folder = self.directory / str(channel.guild.id)
+        folder.mkdir(parents=True, exist_ok=True)
+        base = folder / f'{kind}-{channel.id}'
+        jsonl_path, html_path = (base.with_name(base.name + suffix)
+                                 for suffix in SUFFIXES)
+        jsonl_part, html_part = (path.with_name(path.name + '.part')
+                                 for path in (jsonl_path, html_path))
+
+        count = 0
+        try:
+            with gzip.open(jsonl_part, 'wt', encoding='utf-8') as jsonl:
+                with gzip.open(html_part, 'wt', encoding='utf-8') as page:
+                    page.write(
+                        PAGE_HEAD.format(name=html.escape(channel.name)))
+                    # history() fetches 100 messages per request and hands
+                    # them over one at a time
+                    async for message in channel.history(limit=None,
+                                                         oldest_first=True):
+                        record = _record(message)
+                        jsonl.write(
+                            json.dumps(record, ensure_ascii=False) + '\n')
+                        page.write(_render(record))
+                        count += 1
+                    page.write(
+                        PAGE_FOOT.format(
+                            count=count,
+                            closed=f'{closed_at:%Y-%m-%d %H:%M} UTC'))
+            os.replace(jsonl_part, jsonl_path)
+            os.replace(html_part, html_path)
+        finally:
+            jsonl_part.unlink(missing_ok=True)
+            html_part.unlink(missing_ok=True)
+
+        await self.db.add_transcript(channel.guild.id, channel.id,
+                                     channel.name, user_id, kind, closed_at,
+                                     count, str(base))
+        return base
+
+    def close(self, channel: discord.TextChannel, kind: str,
+              user_id: Optional[int]) -> bool:
+        """Archive and then delete ``channel`` in the background. Returns
+        False if the channel is already being closed."""
+        if channel.id in self._tasks:
+            return False
+        task = asyncio.create_task(self._close(channel, kind, user_id))
+        self._tasks[channel.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(channel.id, None))
+        return True
+
+    async def _close(self, channel: discord.TextChannel, kind: str,
+                     user_id: Optional[int]) -> None:
+        try:
+            await self.write(channel, kind, user_id, datetime.utcnow())
+        except Exception as e:
+            print(f"[TRANSCRIPT] Archiving #{channel.name} failed: {e}")
+            try:
+                await channel.send("❌ The transcript could not be saved, "
+                                   "so this channel was kept. Try closing "
+                                   "it again later.")
+            except discord.HTTPException:
+                pass
+            return
+        try:
+            # The ticket index forgets it through on_guild_channel_delete
+            await channel.delete()
+        except discord.HTTPException as e:
+            print(f"[TRANSCRIPT] Deleting #{channel.name} failed: {e}")
+
+    async def wait_closed(self) -> None:
+        """Wait for the archives still being written."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks.values(),
+                                 return_exceptions=True)
@@ -0,0 +1,165 @@
+import asyncio
+from datetime import datetime
+from typing import Callable, Optional
+
+from database import MILLI, Database, to_milli
+
+# Seconds of voice time that make up one scoring unit
+SESSION_UNIT = 300
+
+
+class VoiceSession:
+    __slots__ = ('guild_id', 'channel_id', 'started_at', 'last_seen',
+                 'units_credited')
+
+    def __init__(self, guild_id: int, channel_id: int, started_at: datetime,
+                 last_seen: datetime, units_credited: int = 0):
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.started_at = started_at
+        self.last_seen = last_seen
+        self.units_credited = units_credited
+
+    def units(self, now: datetime, closing: bool = False) -> int:
+        units = int((now - self.started_at).total_seconds() / SESSION_UNIT)
+        # A finished session is always worth at least one unit
+        return max(1, units) if closing else units
+
+
+class VoiceTracker:
+    """Open voice sessions, mirrored in the ``voice_sessions`` table.
+
+    Sessions are keyed by ``(guild_id, user_id)`` and a guild's stored
+    sessions are read when it is first reconciled, so a process only ever
+    holds, credits and settles the guilds its shards serve. Sessions are
+    credited as they accrue by :meth:`accrue`, so a crash only loses the
+    time since the last tick. ``rate_for`` maps a channel ID to its
+    points-per-unit rate; it can be swapped at runtime.
+    """
+
+    def __init__(self,
+                 db: Database,
+                 rate_for: Callable[[int], float] = lambda channel_id: 1.0):
+        self.db = db
+        self.rate_for = rate_for
+        self.sessions: dict[tuple[int, str], VoiceSession] = {}
+        self.loaded_guilds: set[int] = set()
+        # Held across each credit write, so a session is never credited
+        # from a units_credited value another write is about to advance
+        self._lock = asyncio.Lock()
+
+    def _credit(self,
+                key: tuple[int, str],
+                session: VoiceSession,
+                now: datetime,
+                closing: bool = False) -> tuple[int, str, int, int, datetime]:
+        units = session.units(now, closing)
+        rate = self.rate_for(session.channel_id)
+        points = to_milli(units * rate) - to_milli(
+            session.units_credited * rate)
+        return *key, points, units, now
+
+    async def load(self, guild_id: int) -> None:
+        for (user_id, channel_id, started_at, last_seen,
+             units_credited) in await self.db.voice_sessions(guild_id):
+            self.sessions[(guild_id, user_id)] = VoiceSession(
+                guild_id, channel_id, started_at, last_seen, units_credited)
+        self.loaded_guilds.add(guild_id)
+
+    async def join(self, guild_id: int, user_id: int, channel_id: int,
+                   now: datetime) -> None:
+        async with self._lock:
+            await self._join(guild_id, user_id, channel_id, now)
+
+    async def _join(self, guild_id: int, user_id: int, channel_id: int,
+                    now: datetime) -> None:
+        self.sessions[(guild_id, str(user_id))] = VoiceSession(
+            guild_id, channel_id, now, now)
+        await self.db.open_voice_session(guild_id, user_id, channel_id, now)
+
+    async def move(self, guild_id: int, user_id: int, channel_id: int) -> None:
+        async with self._lock:
+            await self._move(guild_id, user_id, channel_id)
+
+    async def _move(self, guild_id: int, user_id: int,
+                    channel_id: int) -> None:
+        session = self.sessions.get((guild_id, str(user_id)))
+        if session is not None:
+            session.channel_id = channel_id
+            await self.db.move_voice_session(guild_id, user_id, channel_id)
+
+    async def leave(self, guild_id: int, user_id: int,
+                    now: datetime) -> Optional[float]:
+        """Close a session and return the points it still had to earn."""
+        key = (guild_id, str(user_id))
+        async with self._lock:
+            session = self.sessions.pop(key, None)
+            if session is None:
+                return None
+            credit = self._credit(key, session, now, closing=True)
+            await self.db.credit_voice([credit], [key])
+        return credit[2] / MILLI
+
+    async def accrue(self, now: datetime) -> int:
+        """Credit every open session for the units it accrued since the
+        last tick, in one transaction. Returns the number of sessions that
+        earned points."""
+        async with self._lock:
+            credited = []
+            for key, session in self.sessions.items():
+                credit = self._credit(key, session, now)
+                if credit[3] > session.units_credited:
+                    credited.append((session, credit))
+            await self.db.credit_voice([credit for _, credit in credited])
+            for session, (guild_id, user_id, _, units, _) in credited:
+                # Only the session that was credited, never one opened
+                # under the same key since
+                if self.sessions.get((guild_id, user_id)) is session:
+                    session.units_credited = units
+                    session.last_seen = now
+        return len(credited)
+
+    async def reconcile(self, guild_id: int, connected: dict[int, int],
+                        now: datetime) -> None:
+        """Align stored sessions for a guild with its live voice states.
+
+        ``connected`` maps member ID to voice channel ID. Stored sessions of
+        members who left while the bot was down are settled at the last time
+        they were seen; members in voice without a session get a new one.
+        """
+        async with self._lock:
+            await self._reconcile(guild_id, connected, now)
+
+    async def _reconcile(self, guild_id: int, connected: dict[int, int],
+                         now: datetime) -> None:
+        if guild_id not in self.loaded_guilds:
+            await self.load(guild_id)
+        stale = [
+            key for key, session in self.sessions.items()
+            if session.guild_id == guild_id and int(key[1]) not in connected
+        ]
+        credits = [
+            self._credit(key, self.sessions[key],
+                         self.sessions[key].last_seen, closing=True)
+            for key in stale
+        ]
+        await self.db.credit_voice(credits, stale)
+        for key in stale:
+            del self.sessions[key]
+
+        for member_id, channel_id in connected.items():
+            session = self.sessions.get((guild_id, str(member_id)))
+            if session is None:
+                await self._join(guild_id, member_id, channel_id, now)
+            elif session.channel_id != channel_id:
+                await self._move(guild_id, member_id, channel_id)
+
+    async def settle_all(self, now: datetime) -> None:
+        """Close every open session in a single commit."""
+        async with self._lock:
+            credits = [
+                self._credit(key, session, now, closing=True)
+                for key, session in self.sessions.items()
+            ]
+            await self.db.credit_voice(credits, list(self.sessions))
+            self.sessions.clear()